@@ -1,76 +1,138 @@
-from flask import Flask, request, jsonify
-import os
-import cv2
-from utils.perform_inference import DamageSegmentationPipeline, Config
-from pathlib import Path
-from utils.others import download_image, save_and_upload_mask, split_filename_and_extension, count_building_clusters
+import json
+import threading
+import multiprocessing
+from flask import Flask, Response, request, jsonify
+from utils.jobs import job_manager
+from utils.metrics import metrics, gauge_lines
+from utils.model_registry import model_registry
+from utils.perform_inference import POSTPROCESSING_MODES
+from utils.result_cache import result_cache
+from utils.serving import process_image_pairs
+from utils.settings import (
+    LOCALISATION_MODEL_PATH, DAMAGE_MODEL_PATH, WARMUP_MODELS, INFERENCE_PROCESSES, WEIGHT_WATCH_INTERVAL,
+)
+from utils.weight_watcher import WeightWatcher, create_weight_source
+from utils.worker_pool import get_inference_pool
 # from flask_ngrok import run_with_ngrok
 
 app = Flask(__name__)
 
+_services_started = False
+_services_lock = threading.Lock()
+
+def start_services():
+    """Start the inference workers (or warm the models) and the weight watcher, once per process."""
+    global _services_started
+    with _services_lock:
+        if _services_started:
+            return
+        _services_started = True
+
+    # Pay the model loading cost at boot instead of on the first request
+    if INFERENCE_PROCESSES > 0:
+        # Models live in the worker processes; the web process stays lightweight
+        get_inference_pool().start(INFERENCE_PROCESSES)
+    elif WARMUP_MODELS:
+        model_registry.warm_up([LOCALISATION_MODEL_PATH, DAMAGE_MODEL_PATH])
+
+    # Pick up new damage weights without a redeploy
+    if WEIGHT_WATCH_INTERVAL > 0:
+        WeightWatcher(create_weight_source()).start()
+
+# Spawned inference workers re-import the entry script (and so this module) before they know their parent,
+# but already carry their own process name; only the serving process starts services
+if multiprocessing.current_process().name == "MainProcess":
+    start_services()
+
 @app.get("/")
 def index():
     return jsonify(status="ok",
                    message="DeployForce inference service is running 🚀"), 200
 
-@app.route('/predict', methods=['POST'])
-def predict():
+@app.get("/cache/stats")
+def cache_stats():
+    return jsonify(result_cache.stats()), 200
+
+def parse_predict_request():
+    """Read the image pairs and options shared by /predict and /jobs, or return an error response."""
     data = request.json
     image_pairs = data.get("images", [])
+    postprocessing = data.get("postprocessing", "morphology")
+
+    if postprocessing not in POSTPROCESSING_MODES:
+        return None, (jsonify(error=f"postprocessing must be one of {list(POSTPROCESSING_MODES)}"), 400)
+    return (image_pairs, postprocessing), None
+
+@app.get("/batching/stats")
+def batching_stats():
+    return jsonify(model_registry.batching_stats()), 200
+
+@app.get("/metrics")
+def prometheus_metrics():
+    """Stage latencies and counters, plus result cache and micro-batching stats, for Prometheus."""
+    cache = result_cache.stats()
+    extra = gauge_lines("inference_result_cache_lookups_total", "Result cache lookups by outcome",
+                        [({"outcome": outcome}, cache[outcome]) for outcome in ("memory_hits", "disk_hits", "misses")],
+                        kind="counter")
+    extra += gauge_lines("inference_result_cache_evictions_total", "Result cache evictions by tier",
+                         [({"tier": "memory"}, cache["memory_evictions"]), ({"tier": "disk"}, cache["disk_evictions"])],
+                         kind="counter")
+    extra += gauge_lines("inference_result_cache_entries", "Results held in memory", [({}, cache["memory_entries"])])
+
+    batching = model_registry.batching_stats()
+    extra += gauge_lines("inference_microbatch_batches_total", "Forward passes run by the micro-batcher",
+                         [({"model": path}, stats["batches"]) for path, stats in batching.items()], kind="counter")
+    extra += gauge_lines("inference_microbatch_tiles_total", "Tiles run by the micro-batcher",
+                         [({"model": path}, stats["tiles"]) for path, stats in batching.items()], kind="counter")
+    extra += gauge_lines("inference_microbatch_queued", "Tiles waiting for a forward pass",
+                         [({"model": path}, stats["queued"]) for path, stats in batching.items()])
+    return Response(metrics.render(extra), mimetype="text/plain; version=0.0.4")
 
-    mask_image_urls = []
-    damage_severities = []
-
-    for pair in image_pairs:
-        mask_entry = {}
-
-        for image_name, image_url in pair.items():
-            print(f"Processing {image_name}...")
-
-            # Decide model path
-            if "pre_disaster" in image_name:
-                model_path = "./models/best_localization.pt"
-                mask_type = "localisation"
-            elif "post_disaster" in image_name:
-                model_path = "./models/best_256_new.pt"
-                mask_type = "damage_severity_mask"
-            else:
-                continue  # Skip unrelated files
-
-            # Setup pipeline
-            config = Config.default_config()
-            config.model_path = model_path
-            config.skip_save = True
-            pipeline = DamageSegmentationPipeline(config=config)
-
-            # Download, read and predict
-            image_path = download_image(image_url)
-            image = cv2.imread(image_path)
-
-            if image is None:
-                print(f"Failed to load image: {image_path}")
-                continue
-
-            pred_mask = pipeline.model.generate_prediction_mask(image, Path(image_path).stem)
-            processed_mask = pipeline.postprocessor.apply_morphological_operations(pred_mask)
-            uploaded_url = save_and_upload_mask(processed_mask, f"{split_filename_and_extension(image_name)[0]}_mask_{split_filename_and_extension(image_name)[1]}")
-
-            # Save to structure
-            mask_entry[image_name] = uploaded_url
-
-            # For damage masks, return stats (dummy for now)
-            if mask_type == "damage_severity_mask":
-                stats = count_building_clusters(processed_mask)
-                damage_severities.append(stats)
-
-            os.remove(image_path)
-
-        mask_image_urls.append(mask_entry)
-
-    return jsonify({
-        "mask_image_urls": mask_image_urls,
-        "damage_severities": damage_severities,
-    })
+@app.route('/predict', methods=['POST'])
+def predict():
+    params, error = parse_predict_request()
+    if error:
+        return error
+    image_pairs, postprocessing = params
+
+    with metrics.timed("predict_request"):
+        return jsonify(process_image_pairs(image_pairs, postprocessing))
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    params, error = parse_predict_request()
+    if error:
+        return error
+    image_pairs, postprocessing = params
+
+    job_id = job_manager.submit(image_pairs, postprocessing)
+    return jsonify(job_id=job_id,
+                   status_url=f"/jobs/{job_id}",
+                   results_url=f"/jobs/{job_id}/results",
+                   stream_url=f"/jobs/{job_id}/stream"), 202
+
+@app.get("/jobs/<job_id>")
+def job_status(job_id):
+    status = job_manager.status(job_id)
+    if status is None:
+        return jsonify(error="job not found"), 404
+    return jsonify(status), 200
+
+@app.get("/jobs/<job_id>/results")
+def job_results(job_id):
+    results = job_manager.results(job_id, since=request.args.get("since", 0, type=int))
+    if results is None:
+        return jsonify(error="job not found"), 404
+    return jsonify(results), 200
+
+@app.get("/jobs/<job_id>/stream")
+def job_stream(job_id):
+    if job_manager.status(job_id) is None:
+        return jsonify(error="job not found"), 404
+
+    # One JSON document per line as each pair finishes, then the final job status
+    lines = (json.dumps(record) + "\n" for record in job_manager.stream(job_id))
+    return Response(lines, mimetype="application/x-ndjson")
 
 if __name__ == '__main__':
     app.run(host="0.0.0.0", port=8001, debug=True)
\ No newline at end of file
@@ -0,0 +1,78 @@
+"""
+Micro-benchmark for ``count_building_clusters``.
+
+Times the single-pass implementation against the original per-class loop
+(one opening and one labelling per damage class, one dict per cluster) on
+synthetic label maps and reports the speedup. That both give identical
+output is checked by ``tests/test_clusters.py``.
+
+Usage:
+    python -m benchmarks.bench_clusters --sizes 512 1024 4096
+"""
+import argparse
+import cv2
+import numpy as np
+from collections import defaultdict
+from typing import Any, Dict, List
+
+from benchmarks.stubs import best_of, make_synthetic_scene
+from utils.constants import COST_PER_PIXEL, DAMAGE_CLASSES
+from utils.others import count_building_clusters
+from utils.perform_inference import Config
+
+
+def reference_count_building_clusters(mask: np.ndarray) -> Dict[str, Any]:
+    """Original per-class implementation, kept for comparison."""
+    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (5, 5))
+    stats: Dict[str, Any] = {info["count_key"]: 0 for info in DAMAGE_CLASSES.values()}
+    cluster_list: List[Dict[str, Any]] = []
+    area_tot_px = defaultdict(int)
+
+    for cls_name, info in DAMAGE_CLASSES.items():
+        binary = (mask == info["label"]).astype(np.uint8) * 255
+        cleaned = cv2.morphologyEx(binary, cv2.MORPH_OPEN, kernel, iterations=1)
+        n_labels, _, comp_stats, _ = cv2.connectedComponentsWithStats(cleaned, connectivity=8)
+        stats[info["count_key"]] = n_labels - 1
+        for cid in range(1, n_labels):
+            area_px = int(comp_stats[cid, cv2.CC_STAT_AREA])
+            cluster_list.append({
+                "class": cls_name,
+                "cluster_id": cid,
+                "area": area_px,
+                "repair_cost": round(area_px * COST_PER_PIXEL[cls_name], 2),
+            })
+            area_tot_px[cls_name] += area_px
+
+    area_breakdown = dict(area_tot_px)
+    cost_breakdown = {cls: round(area_px * COST_PER_PIXEL[cls], 2) for cls, area_px in area_breakdown.items()}
+    stats.update({
+        "areas": cluster_list,
+        "area_breakdown": area_breakdown,
+        "cost_breakdown": cost_breakdown,
+        "total_estimated_cost": round(sum(cost_breakdown.values()), 2),
+    })
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the building cluster statistics")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[512, 1024, 4096])
+    parser.add_argument("--density", type=float, default=3.0, help="Buildings per 1000 pixels")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    config = Config.default_config()
+
+    print(f"{'size':>6} {'clusters':>9} {'reference (s)':>14} {'single-pass (s)':>16} {'columnar (s)':>13} {'speedup':>8}")
+    for size in args.sizes:
+        _, mask = make_synthetic_scene(size, config, args.density, seed=size)
+        reference_time = best_of(lambda: reference_count_building_clusters(mask), args.repeats)
+        single_time = best_of(lambda: count_building_clusters(mask), args.repeats)
+        columnar_time = best_of(lambda: count_building_clusters(mask, columnar=True), args.repeats)
+        clusters = len(count_building_clusters(mask)["areas"])
+        print(f"{size:>6} {clusters:>9} {reference_time:>14.4f} {single_time:>16.4f} "
+              f"{columnar_time:>13.4f} {reference_time / single_time:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Micro-benchmark for tile mask assembly.
+
+Times building tile label maps from the same predictions with the polygon
+path (``masks.xy`` filled one instance at a time) and the raster path
+(``masks.data`` composited in one step), and reports how closely they agree
+when the masks come at other model input sizes and go through the letterbox
+inverse. Polygon timings include deriving the polygons from the raster
+masks, as ultralytics does when ``masks.xy`` is read. The assembly itself is
+checked by ``tests/test_mask_assembly.py``.
+
+Usage:
+    python -m benchmarks.bench_mask_assembly --instances 5 30 100
+"""
+import argparse
+import cv2
+import numpy as np
+from types import SimpleNamespace
+from typing import Any, List, Optional
+
+from benchmarks.stubs import StandInMasks, best_of
+from utils.perform_inference import Config, YoloInference
+
+
+class DerivedPolygonMasks:
+    """``masks`` whose ``xy`` is traced from the raster masks on access, like ultralytics' ``Masks.xy``."""
+
+    def __init__(self, data: np.ndarray):
+        self.data = data
+
+    @property
+    def xy(self) -> List[np.ndarray]:
+        polygons = []
+        for mask in self.data:
+            contours, _ = cv2.findContours((mask > 0.5).astype(np.uint8), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+            largest = max(contours, key=len) if contours else np.zeros((0, 1, 2), dtype=np.int32)
+            polygons.append(largest.reshape(-1, 2).astype(np.float32))
+        return polygons
+
+
+class ReplayModel:
+    """Model that answers every ``predict`` with fresh results built from fixed instances."""
+
+    def __init__(self, tiles: int, instances: int, tile_size: int, mask_size: Optional[int] = None,
+                 derived_polygons: bool = False, seed: int = 0):
+        rng = np.random.default_rng(seed)
+        self.tile_shape = (tile_size, tile_size)
+        self.mask_size = mask_size
+        self.derived_polygons = derived_polygons
+        self.instances = []
+        for _ in range(tiles):
+            polygons = []
+            for _ in range(instances):
+                center = tuple(float(v) for v in rng.integers(0, tile_size, 2))
+                extent = tuple(float(v) for v in rng.integers(8, 60, 2))
+                polygons.append(cv2.boxPoints((center, extent, float(rng.uniform(0, 90)))).astype(np.int32)
+                                .astype(np.float32))
+            classes = rng.integers(0, 4, instances).astype(np.float32)
+            confidences = rng.uniform(0.1, 1.0, instances).astype(np.float32)
+            data = StandInMasks(polygons, self.tile_shape, mask_size).data
+            self.instances.append((polygons, classes, confidences, data))
+
+    def predict(self, source, conf: float = 0.25, verbose: bool = False, **kwargs) -> List[Any]:
+        results = []
+        for polygons, classes, confidences, data in self.instances[:len(source)]:
+            masks = (DerivedPolygonMasks(data) if self.derived_polygons
+                     else StandInMasks(polygons, self.tile_shape, self.mask_size, data))
+            results.append(SimpleNamespace(masks=masks, boxes=SimpleNamespace(cls=classes, conf=confidences)))
+        return results
+
+
+def _assembler(model: ReplayModel, assembly: str, overlap: str) -> YoloInference:
+    config = Config.default_config()
+    config.mask_assembly = assembly
+    config.mask_overlap = overlap
+    return YoloInference(config, model)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark polygon vs raster tile mask assembly")
+    parser.add_argument("--instances", type=int, nargs="+", default=[5, 30, 100], help="Instances per tile")
+    parser.add_argument("--tiles", type=int, default=16)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    tile_size = Config.default_config().tile_size
+    tiles = [np.zeros((tile_size, tile_size, 3), dtype=np.uint8)] * args.tiles
+
+    # Masks at another model input size go through the letterbox inverse
+    print(f"{'mask size':>9} {'agreement':>10}")
+    for mask_size in (tile_size // 2, 2 * tile_size, 640):
+        scaled = ReplayModel(args.tiles, 30, tile_size, mask_size)
+        polygon = np.stack(_assembler(scaled, "polygon", "last").process_tiles(tiles))
+        raster = np.stack(_assembler(scaled, "raster", "last").process_tiles(tiles))
+        agreement = float((polygon == raster).mean())
+        print(f"{mask_size:>9} {agreement:>10.4f}")
+
+    print(f"\n{'instances':>9} {'polygon (ms/tile)':>18} {'raster (ms/tile)':>17} {'speedup':>8}")
+    for instances in args.instances:
+        timed = ReplayModel(args.tiles, instances, tile_size, derived_polygons=True)
+        polygon, raster = _assembler(timed, "polygon", "last"), _assembler(timed, "raster", "last")
+        polygon_time = best_of(lambda: polygon.process_tiles(tiles), args.repeats)
+        raster_time = best_of(lambda: raster.process_tiles(tiles), args.repeats)
+        print(f"{instances:>9} {polygon_time / args.tiles * 1000:>18.3f} {raster_time / args.tiles * 1000:>17.3f} "
+              f"{polygon_time / raster_time:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
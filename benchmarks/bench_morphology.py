@@ -0,0 +1,100 @@
+"""
+Micro-benchmark for ``Postprocessor.apply_morphological_operations``.
+
+Times the label-map implementation against the original colour-mask,
+per-pixel loop on synthetic masks and reports the speedup. That both give
+identical output is checked by ``tests/test_morphology.py``.
+
+Usage:
+    python -m benchmarks.bench_morphology --sizes 512 1024 4096
+"""
+import argparse
+import time
+import cv2
+import numpy as np
+
+from benchmarks.stubs import best_of
+from utils.perform_inference import Config, Postprocessor
+
+
+def make_synthetic_mask(size: int, config: Config, density: float = 0.002, seed: int = 0) -> np.ndarray:
+    """Draw random overlapping building-like blobs of every class on an empty label map."""
+    rng = np.random.default_rng(seed)
+    mask = np.zeros((size, size), dtype=np.uint8)
+    labels = [config.class_to_label(class_id) for class_id in config.color_map] + [config.class_to_label(-1)]
+    n_buildings = max(1, int(size * size * density / 10))
+
+    for _ in range(n_buildings):
+        lbl = labels[rng.integers(len(labels))]
+        center = tuple(int(v) for v in rng.integers(0, size, 2))
+        axes = tuple(int(v) for v in rng.integers(3, 20, 2))
+        cv2.ellipse(mask, center, axes, float(rng.uniform(0, 180)), 0, 360, lbl, -1)
+
+    # Salt noise that the opening step should remove
+    noise = rng.random((size, size)) < 0.001
+    mask[noise] = labels[0]
+    return mask
+
+
+def reference_apply_morphological_operations(postprocessor: Postprocessor, pred_mask: np.ndarray) -> np.ndarray:
+    """Original colour-mask implementation with the per-pixel priority merge, kept for comparison."""
+    processed_mask = np.zeros_like(pred_mask)
+    priority_map = np.zeros(pred_mask.shape[:2], dtype=np.uint8)
+
+    unique_colors = np.unique(pred_mask.reshape(-1, pred_mask.shape[2]), axis=0)
+    unique_colors = [tuple(color) for color in unique_colors if np.any(color != 0)]
+
+    class_priorities = {0: 1, 1: 2, 2: 3, 3: 4}
+    color_priorities = []
+    for color in unique_colors:
+        class_id = postprocessor.config.color_map_inverse.get(tuple(color), 0)
+        color_priorities.append((color, class_priorities.get(class_id, 1)))
+    color_priorities.sort(key=lambda x: x[1])
+
+    for color, priority in color_priorities:
+        binary_mask = np.all(pred_mask == color, axis=2).astype(np.uint8) * 255
+
+        kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (5, 5))
+        opened = cv2.morphologyEx(binary_mask, cv2.MORPH_OPEN, kernel, iterations=2)
+        kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
+        closed = cv2.morphologyEx(opened, cv2.MORPH_CLOSE, kernel, iterations=2)
+        separated = cv2.erode(closed, kernel, iterations=1)
+
+        contours, _ = cv2.findContours(separated, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        filtered = np.zeros_like(separated)
+        for contour in contours:
+            if cv2.contourArea(contour) > 50:
+                cv2.drawContours(filtered, [contour], 0, 255, -1)
+
+        for y in range(filtered.shape[0]):
+            for x in range(filtered.shape[1]):
+                if filtered[y, x] > 0 and priority > priority_map[y, x]:
+                    processed_mask[y, x] = color
+                    priority_map[y, x] = priority
+
+    return processed_mask
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the morphological post-processing")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[512, 1024, 4096])
+    parser.add_argument("--repeats", type=int, default=3, help="Repeats for the vectorised version")
+    args = parser.parse_args()
+
+    config = Config.default_config()
+    postprocessor = Postprocessor(config)
+
+    print(f"{'size':>6} {'reference (s)':>14} {'vectorised (s)':>15} {'speedup':>8}")
+    for size in args.sizes:
+        mask = make_synthetic_mask(size, config, seed=size)
+
+        # The per-pixel loop is slow enough that a single run is representative
+        start = time.perf_counter()
+        reference_apply_morphological_operations(postprocessor, config.colorize(mask))
+        reference_time = time.perf_counter() - start
+        vectorised_time = best_of(lambda: postprocessor.apply_morphological_operations(mask), args.repeats)
+        print(f"{size:>6} {reference_time:>14.3f} {vectorised_time:>15.4f} {reference_time / vectorised_time:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
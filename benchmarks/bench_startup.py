@@ -0,0 +1,74 @@
+"""
+Start-up benchmark and regression check for the serving path's imports.
+
+Imports each target module in a fresh interpreter, reports the import time
+(and, for ``app``, the time to answer a first request) and fails if any
+heavy dependency was imported eagerly. Models, plotting and the remote
+clients should only be loaded on first use.
+
+Usage:
+    python -m benchmarks.bench_startup --repeats 5
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+# Must not be imported just by importing the serving path
+HEAVY_MODULES = ("ultralytics", "torch", "matplotlib", "scipy", "cloudinary", "supabase", "clearml")
+TARGETS = ("utils.perform_inference", "utils.serving", "app")
+
+_CHILD = """
+import json, sys, time
+start = time.perf_counter()
+import {module} as target
+import_s = time.perf_counter() - start
+first_request_s = None
+if hasattr(target, "app"):
+    start = time.perf_counter()
+    target.app.test_client().get("/")
+    first_request_s = time.perf_counter() - start
+print(json.dumps({{
+    "import_s": import_s,
+    "first_request_s": first_request_s,
+    "heavy": [name for name in {heavy!r} if name in sys.modules],
+}}))
+"""
+
+
+def measure(module: str) -> dict:
+    """Import ``module`` in a fresh interpreter and return its timings and eagerly loaded heavy modules."""
+    # Keep the boot path model-free: no worker pool, warm-up or weight watcher
+    env = {**os.environ, "INFERENCE_PROCESSES": "0", "WARMUP_MODELS": "false", "WEIGHT_WATCH_INTERVAL": "0"}
+    code = _CHILD.format(module=module, heavy=HEAVY_MODULES)
+    output = subprocess.run([sys.executable, "-c", code], env=env, check=True,
+                            capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark service start-up (import time)")
+    parser.add_argument("--modules", nargs="+", default=list(TARGETS))
+    parser.add_argument("--repeats", type=int, default=5, help="Fresh interpreters per module")
+    args = parser.parse_args()
+
+    print(f"{'module':<26} {'import (s)':>11} {'first request (s)':>18}  eager heavy imports")
+    failures = []
+    for module in args.modules:
+        runs = [measure(module) for _ in range(args.repeats)]
+        import_s = statistics.median(run["import_s"] for run in runs)
+        first = [run["first_request_s"] for run in runs if run["first_request_s"] is not None]
+        first_s = f"{statistics.median(first):.4f}" if first else "-"
+        heavy = sorted({name for run in runs for name in run["heavy"]})
+        print(f"{module:<26} {import_s:>11.3f} {first_s:>18}  {', '.join(heavy) or '-'}")
+        if heavy:
+            failures.append(module)
+
+    if failures:
+        raise AssertionError(f"Heavy dependencies imported eagerly by: {', '.join(failures)}")
+
+
+if __name__ == "__main__":
+    main()
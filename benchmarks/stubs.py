@@ -0,0 +1,215 @@
+"""
+Offline stand-ins used by the benchmark suite.
+
+- ``StandInModel``: a tiny CPU "segmentation model" with YOLO's ``predict``
+  interface. It outlines the bright buildings of a synthetic scene and
+  classifies them by colour.
+- ``make_synthetic_scene``: images (and matching label maps) with buildings
+  of every class at a given density.
+- ``StubServer``: local HTTP server hosting images from memory and answering
+  Cloudinary upload calls, so ``/predict`` runs end to end without a network.
+- ``best_of``: fastest of several timed calls, for the micro-benchmarks.
+"""
+import json
+import time
+import threading
+import cv2
+import numpy as np
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from utils.perform_inference import Config
+
+# BGR colour drawn for each class ID in synthetic scenes (distinct from the mask palette on purpose)
+SCENE_COLORS = {0: (90, 200, 90), 1: (90, 200, 200), 2: (90, 140, 220), 3: (80, 80, 230)}
+
+
+# ------------------------------------------------------------------------
+# Stand-in model
+# ------------------------------------------------------------------------
+
+class StandInMasks:
+    """``masks`` of a stand-in result: outline polygons, plus raster masks drawn from them on first use."""
+
+    def __init__(self, xy: List[np.ndarray], tile_shape: Tuple[int, int], mask_size: Optional[int] = None,
+                 data: Optional[np.ndarray] = None):
+        self.xy = xy
+        self._tile_shape = tile_shape
+        self._mask_size = mask_size
+        self._data = data
+
+    @property
+    def data(self) -> np.ndarray:
+        """(N, S, S) float masks at the model's input size ``S`` (the tile scaled to fit, padding centred)."""
+        if self._data is None:
+            height, width = self._tile_shape
+            size = self._mask_size or max(height, width)
+            gain = min(size / height, size / width)
+            offset = np.array([(size - width * gain) / 2, (size - height * gain) / 2], dtype=np.float32)
+            self._data = np.zeros((len(self.xy), size, size), dtype=np.float32)
+            for mask, polygon in zip(self._data, self.xy):
+                if gain == 1 and not offset.any():
+                    cv2.fillPoly(mask, [polygon.astype(np.int32)], 1.0)
+                else:
+                    cv2.fillPoly(mask, [np.round(polygon * gain + offset).astype(np.int32)], 1.0)
+        return self._data
+
+
+class StandInModel:
+    """
+    Cheap deterministic replacement for the YOLO model.
+
+    Each tile is thresholded, every external contour becomes one instance
+    and its class is the scene colour closest to the contour's mean colour.
+    The results carry ``masks.xy``, ``masks.data`` (at ``mask_size``, default
+    the tile size), ``boxes.cls`` and ``boxes.conf`` like ultralytics results.
+    """
+
+    def __init__(self, threshold: int = 40, mask_size: Optional[int] = None):
+        self.threshold = threshold
+        self.mask_size = mask_size
+        self._colors = np.array([SCENE_COLORS[c] for c in sorted(SCENE_COLORS)], dtype=np.float32)
+
+    def _predict_tile(self, tile: np.ndarray) -> SimpleNamespace:
+        gray = cv2.cvtColor(np.ascontiguousarray(tile), cv2.COLOR_BGR2GRAY)
+        _, binary = cv2.threshold(gray, self.threshold, 255, cv2.THRESH_BINARY)
+        contours, _ = cv2.findContours(binary, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        contours = [c for c in contours if len(c) >= 3]
+        if not contours:
+            return SimpleNamespace(masks=None, boxes=SimpleNamespace(cls=np.zeros(0), conf=np.zeros(0)))
+
+        polygons, classes = [], []
+        for contour in contours:
+            x, y, w, h = cv2.boundingRect(contour)
+            mean = tile[y + h // 2, x + w // 2].astype(np.float32)
+            classes.append(int(np.argmin(((self._colors - mean) ** 2).sum(axis=1))))
+            polygons.append(contour.reshape(-1, 2).astype(np.float32))
+        return SimpleNamespace(masks=StandInMasks(polygons, tile.shape[:2], self.mask_size),
+                               boxes=SimpleNamespace(cls=np.array(classes, dtype=np.float32),
+                                                     conf=np.ones(len(classes), dtype=np.float32)))
+
+    def predict(self, source, conf: float = 0.25, verbose: bool = False, **kwargs) -> List[SimpleNamespace]:
+        tiles = source if isinstance(source, list) else [source]
+        return [self._predict_tile(tile) for tile in tiles]
+
+
+# ------------------------------------------------------------------------
+# Synthetic data
+# ------------------------------------------------------------------------
+
+def make_synthetic_scene(size: int, config: Config, density: float = 0.002,
+                         seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Draw rotated rectangular buildings of random classes on a dark, noisy background.
+
+    Returns the BGR image and the label map of what was drawn. ``density``
+    is the number of buildings per 1000 pixels.
+    """
+    rng = np.random.default_rng(seed)
+    image = rng.integers(0, 30, (size, size, 3), dtype=np.uint8)
+    labels = np.zeros((size, size), dtype=np.uint8)
+    n_buildings = max(1, int(size * size * density / 1000))
+
+    for _ in range(n_buildings):
+        class_id = int(rng.integers(len(SCENE_COLORS)))
+        center = tuple(float(v) for v in rng.integers(0, size, 2))
+        extent = tuple(float(v) for v in rng.integers(8, 40, 2))
+        box = cv2.boxPoints((center, extent, float(rng.uniform(0, 90)))).astype(np.int32)
+        cv2.fillPoly(image, [box], SCENE_COLORS[class_id])
+        cv2.fillPoly(labels, [box], config.class_to_label(class_id))
+    return image, labels
+
+
+# ------------------------------------------------------------------------
+# Local HTTP stubs
+# ------------------------------------------------------------------------
+
+class StubServer:
+    """
+    Local HTTP server for end-to-end runs.
+
+    ``GET /images/<name>`` serves PNG bytes registered with ``add_image``;
+    ``POST /v1_1/<cloud>/<type>/upload`` answers like Cloudinary's upload API
+    (point the SDK at it with ``cloudinary.config(upload_prefix=server.url)``).
+    """
+
+    def __init__(self):
+        self.images: Dict[str, bytes] = {}
+        self.uploads = 0
+        self.upload_bytes = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.url = f"http://127.0.0.1:{self._server.server_port}"
+        self._thread = threading.Thread(target=self._server.serve_forever, name="stub-server", daemon=True)
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _send(self, status: int, body: bytes, content_type: str):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                data = stub.images.get(self.path.rsplit("/", 1)[-1])
+                if data is None:
+                    self._send(404, b"not found", "text/plain")
+                else:
+                    self._send(200, data, "image/png")
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                self.rfile.read(length)
+                with stub._lock:
+                    stub.uploads += 1
+                    stub.upload_bytes += length
+                    upload_id = stub.uploads
+                body = json.dumps({
+                    "secure_url": f"{stub.url}/uploads/{upload_id}.png",
+                    "public_id": f"masks/{upload_id}",
+                    "resource_type": "image",
+                    "format": "png",
+                    "created_at": "1970-01-01T00:00:00Z",
+                }).encode("utf-8")
+                self._send(200, body, "application/json")
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def add_image(self, name: str, image: np.ndarray) -> str:
+        """Host ``image`` as a PNG and return its URL."""
+        ok, encoded = cv2.imencode(".png", image)
+        if not ok:
+            raise ValueError(f"Could not encode {name}")
+        self.images[name] = encoded.tobytes()
+        return f"{self.url}/images/{name}"
+
+    def start(self) -> "StubServer":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+# ------------------------------------------------------------------------
+# Timing
+# ------------------------------------------------------------------------
+
+def best_of(fn: Callable[[], Any], repeats: int) -> float:
+    """Return the fastest wall-clock time of ``repeats`` calls."""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
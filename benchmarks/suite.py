@@ -0,0 +1,253 @@
+"""
+Offline CPU benchmark suite for the inference and post-processing hot paths.
+
+Covers tiled inference (``generate_prediction_mask`` with a stand-in model,
+with and without tile pre-filters),
+morphology, majority voting, cluster counting and the end-to-end ``/predict``
+handler against local image-hosting and Cloudinary stubs. Synthetic scenes
+span several sizes and building densities. Results are written as JSON
+(with the commit, library versions and machine) so runs can be compared
+across commits.
+
+Usage:
+    python -m benchmarks.suite --output bench.json
+    python -m benchmarks.suite --quick --only morphology majority_vote
+    python -m benchmarks.suite --output new.json --baseline old.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import contextlib
+import platform
+import statistics
+import subprocess
+import tempfile
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List
+
+# The service reads its settings at import time: no result cache (every run must infer), no worker
+# processes, no weight watcher, stub Cloudinary credentials and placeholder weight files
+_WEIGHTS_DIR = tempfile.mkdtemp(prefix="bench-weights-")
+for _name in ("localisation.pt", "damage.pt"):
+    open(os.path.join(_WEIGHTS_DIR, _name), "wb").close()
+os.environ.update({
+    "RESULT_CACHE_ENABLED": "false",
+    "INFERENCE_PROCESSES": "0",
+    "WARMUP_MODELS": "false",
+    "WEIGHT_WATCH_INTERVAL": "0",
+    "LOCALISATION_MODEL_PATH": os.path.join(_WEIGHTS_DIR, "localisation.pt"),
+    "DAMAGE_MODEL_PATH": os.path.join(_WEIGHTS_DIR, "damage.pt"),
+    "CLOUDINARY_CLOUD_NAME": "bench",
+    "CLOUDINARY_API_KEY": "bench",
+    "CLOUDINARY_API_SECRET": "bench",
+    "NO_PROXY": "127.0.0.1,localhost",
+})
+
+import cv2
+import numpy as np
+
+from benchmarks.stubs import StandInModel, StubServer, make_synthetic_scene
+from utils.perform_inference import Config, Postprocessor, YoloInference, compute_tile_schedule
+from utils.others import count_building_clusters
+
+BENCHMARKS = ("tiling", "tile_filter", "morphology", "majority_vote", "clusters", "predict")
+
+
+def _log(message: str):
+    # Progress goes to stderr so stdout stays valid JSON
+    print(message, file=sys.stderr, flush=True)
+
+
+def _time(fn: Callable[[], Any], repeats: int, warmup: int = 1) -> Dict[str, float]:
+    """Run ``fn`` ``warmup`` times untimed, then ``repeats`` times timed."""
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return {
+        "repeats": repeats,
+        "min_s": min(times),
+        "median_s": statistics.median(times),
+        "mean_s": statistics.fmean(times),
+    }
+
+
+def _record(results: List[Dict[str, Any]], name: str, params: Dict[str, Any], timing: Dict[str, Any]):
+    results.append({"name": name, "params": params, **timing})
+    _log(f"{name:<14} {json.dumps(params):<48} median {timing['median_s'] * 1000:9.2f} ms")
+
+
+# ------------------------------------------------------------------------
+# Benchmarks
+# ------------------------------------------------------------------------
+
+def bench_tiling(results, config: Config, sizes: List[int], densities: List[float], repeats: int):
+    model = YoloInference(config, StandInModel())
+    for size in sizes:
+        for density in densities:
+            image, _ = make_synthetic_scene(size, config, density, seed=size)
+            tiles = len(compute_tile_schedule(size, size, config.tile_size, config.tile_overlap, config.tiling))
+            timing = _time(lambda: model.generate_prediction_mask(image, "bench"), repeats)
+            _record(results, "tiling", {"size": size, "density": density, "tiles": tiles}, timing)
+
+
+def bench_tile_filter(results, config: Config, size: int, nodata_fractions: List[float], repeats: int):
+    """
+    Tiled inference with each tile pre-filter on scenes whose right part is nodata (black).
+
+    The stand-in model is nearly free, so ``tiles_run`` (the model work left) matters more than the time here.
+    """
+    from utils.metrics import metrics
+
+    for nodata in nodata_fractions:
+        image, _ = make_synthetic_scene(size, config, 1.0, seed=size)
+        image[:, size - int(size * nodata):] = 0
+        for tile_filter in (None, "variance", "entropy", "nodata"):
+            filtered = Config.default_config()
+            filtered.tile_filter = tile_filter
+            model = YoloInference(filtered, StandInModel())
+            timing = _time(lambda: model.generate_prediction_mask(image, "bench"), repeats)
+            metrics.clear()
+            model.generate_prediction_mask(image, "bench")
+            timing["tiles_run"] = metrics.counter_values().get(("inference_tiles_total", ()), 0)
+            _record(results, "tile_filter", {"size": size, "nodata": nodata, "filter": tile_filter}, timing)
+
+
+def _bench_label_maps(results, name: str, fn: Callable[[np.ndarray], Any], config: Config,
+                      sizes: List[int], densities: List[float], repeats: int):
+    for size in sizes:
+        for density in densities:
+            _, labels = make_synthetic_scene(size, config, density, seed=size)
+            coverage = round(float((labels > 0).mean()), 4)
+            timing = _time(lambda: fn(labels), repeats)
+            _record(results, name, {"size": size, "density": density, "coverage": coverage}, timing)
+
+
+def bench_predict(results, config: Config, size: int, pairs: int, repeats: int):
+    """End-to-end /predict through the Flask test client, with stubbed image hosting and uploads."""
+    import app as service
+    from utils.cloudinary import get_cloudinary_client
+    from utils.metrics import metrics
+    from utils.model_registry import model_registry
+
+    server = StubServer().start()
+    try:
+        get_cloudinary_client().config(upload_prefix=server.url)
+        model_registry.model_factory = lambda model_path: StandInModel()
+        model_registry.clear()
+
+        images = []
+        for i in range(pairs):
+            pre, _ = make_synthetic_scene(size, config, 1.0, seed=2 * i)
+            post, _ = make_synthetic_scene(size, config, 1.0, seed=2 * i + 1)
+            images.append({
+                f"pair{i}_pre_disaster.png": server.add_image(f"pair{i}_pre.png", pre),
+                f"pair{i}_post_disaster.png": server.add_image(f"pair{i}_post.png", post),
+            })
+
+        client = service.app.test_client()
+
+        def run():
+            response = client.post("/predict", json={"images": images})
+            if response.status_code != 200:
+                raise RuntimeError(f"/predict returned {response.status_code}")
+
+        # Warm up first so the stage stats only cover the timed runs
+        run()
+        metrics.clear()
+        timing = _time(run, repeats, warmup=0)
+        timing["images_per_s"] = 2 * pairs / timing["median_s"]
+        timing["stages"] = metrics.stage_summary()
+        _record(results, "predict", {"size": size, "pairs": pairs}, timing)
+    finally:
+        server.stop()
+
+
+# ------------------------------------------------------------------------
+# Entry point
+# ------------------------------------------------------------------------
+
+def _environment() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def compare(results: List[Dict[str, Any]], baseline_path: str):
+    """Print the median speedup of every result that also appears in a previous run."""
+    with open(baseline_path) as f:
+        baseline = {(r["name"], json.dumps(r["params"], sort_keys=True)): r for r in json.load(f)["results"]}
+    _log(f"\nSpeedup vs {baseline_path} (baseline median / new median):")
+    for result in results:
+        previous = baseline.get((result["name"], json.dumps(result["params"], sort_keys=True)))
+        if previous is not None:
+            _log(f"{result['name']:<14} {json.dumps(result['params']):<48} "
+                 f"{previous['median_s'] / result['median_s']:6.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the offline benchmark suite")
+    parser.add_argument("--only", nargs="+", choices=BENCHMARKS, default=list(BENCHMARKS))
+    parser.add_argument("--quick", action="store_true", help="Small sizes and few repeats, for a smoke run")
+    parser.add_argument("--repeats", type=int, default=None)
+    parser.add_argument("--output", default=None, help="JSON file to write (default: stdout)")
+    parser.add_argument("--baseline", default=None, help="Earlier JSON output to compare against")
+    args = parser.parse_args()
+
+    if args.quick:
+        image_sizes, mask_sizes, densities, repeats, pairs = [512], [512, 1024], [0.2, 2.0], 2, 2
+    else:
+        image_sizes, mask_sizes, densities, repeats, pairs = [512, 1024, 2048], [512, 1024, 4096], [0.2, 1.0, 3.0], 5, 4
+    repeats = args.repeats or repeats
+
+    config = Config.default_config()
+    postprocessor = Postprocessor(config)
+    results: List[Dict[str, Any]] = []
+
+    # The service prints progress ("Processing ...", "Loading model ..."); keep it out of the JSON report
+    with contextlib.redirect_stdout(sys.stderr):
+        if "tiling" in args.only:
+            bench_tiling(results, config, image_sizes, densities, repeats)
+        if "tile_filter" in args.only:
+            bench_tile_filter(results, config, image_sizes[-1], [0.0, 0.5, 0.9], repeats)
+        if "morphology" in args.only:
+            _bench_label_maps(results, "morphology", postprocessor.apply_morphological_operations,
+                              config, mask_sizes, densities, repeats)
+        if "majority_vote" in args.only:
+            _bench_label_maps(results, "majority_vote", postprocessor.majority_voting_building_damage_mask,
+                              config, mask_sizes, densities, repeats)
+        if "clusters" in args.only:
+            _bench_label_maps(results, "clusters", count_building_clusters, config, mask_sizes, densities, repeats)
+        if "predict" in args.only:
+            bench_predict(results, config, image_sizes[-1] if args.quick else 1024, pairs, repeats)
+
+    report = json.dumps({"environment": _environment(), "results": results}, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report + "\n")
+        _log(f"Wrote {len(results)} results to {args.output}")
+    else:
+        print(report)
+    if args.baseline:
+        compare(results, args.baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+import pytest
+
+from benchmarks.bench_clusters import reference_count_building_clusters
+from benchmarks.stubs import make_synthetic_scene
+from utils.others import count_building_clusters
+from utils.perform_inference import Config
+
+
+@pytest.fixture(scope="module")
+def mask():
+    _, label_map = make_synthetic_scene(256, Config.default_config(), 3.0, seed=256)
+    return label_map
+
+
+# Odd crops exercise the band alignment as well
+@pytest.mark.parametrize("crop", [(256, 256), (255, 253)])
+def test_matches_reference(mask, crop):
+    cropped = mask[:crop[0], :crop[1]]
+    assert count_building_clusters(cropped) == reference_count_building_clusters(cropped)
+
+
+@pytest.mark.parametrize("crop", [(256, 256), (255, 253)])
+def test_columnar_matches_reference(mask, crop):
+    cropped = mask[:crop[0], :crop[1]]
+    columns = count_building_clusters(cropped, columnar=True)["areas"]
+    rows = [dict(zip(columns, row)) for row in zip(*columns.values())]
+    assert rows == reference_count_building_clusters(cropped)["areas"]
@@ -0,0 +1,16 @@
+import numpy as np
+import pytest
+
+from benchmarks.bench_morphology import make_synthetic_mask, reference_apply_morphological_operations
+from utils.perform_inference import Config, Postprocessor
+
+
+@pytest.mark.parametrize("size", [96, 131])
+def test_matches_reference(size):
+    config = Config.default_config()
+    postprocessor = Postprocessor(config)
+    mask = make_synthetic_mask(size, config, density=0.02, seed=size)
+
+    expected = reference_apply_morphological_operations(postprocessor, config.colorize(mask))
+    actual = config.colorize(postprocessor.apply_morphological_operations(mask))
+    np.testing.assert_array_equal(actual, expected)
@@ -0,0 +1,114 @@
+import time
+import queue
+import threading
+import numpy as np
+from collections import Counter
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Any, Optional, Tuple
+
+
+class MicroBatcher:
+    """
+    Collects tiles from every in-flight request into shared forward passes.
+
+    Callers submit tiles and wait on one future per tile. A single worker
+    thread takes the first queued tile, keeps collecting until
+    ``max_batch_size`` tiles are queued or ``max_wait_ms`` has passed, runs
+    ``run_batch`` once and routes each output back to its caller.
+    """
+
+    def __init__(self, run_batch: Callable[[List[np.ndarray]], List[np.ndarray]],
+                 max_batch_size: int = 32, max_wait_ms: float = 5.0, name: str = "micro-batcher"):
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue: "queue.Queue[Optional[Tuple[np.ndarray, Future]]]" = queue.Queue()
+        self._submit_lock = threading.Lock()
+        self._closed = False
+        self._stats_lock = threading.Lock()
+        self._batch_sizes: Counter = Counter()
+        self._thread = threading.Thread(target=self._loop, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, tiles: List[np.ndarray]) -> List[Future]:
+        """Queue tiles for inference and return one future per tile."""
+        with self._submit_lock:
+            if not self._closed:
+                futures = []
+                for tile in tiles:
+                    future: Future = Future()
+                    self._queue.put((tile, future))
+                    futures.append(future)
+                return futures
+
+        # Closed (model retired): run in the caller's thread instead
+        futures = []
+        for output in self.run_batch(tiles):
+            future = Future()
+            future.set_result(output)
+            futures.append(future)
+        return futures
+
+    def predict(self, tiles: List[np.ndarray]) -> List[np.ndarray]:
+        """Queue tiles and wait for their outputs, in order."""
+        return [future.result() for future in self.submit(tiles)]
+
+    def _collect(self) -> List[Optional[Tuple[np.ndarray, Future]]]:
+        """Block for the first item, then gather more until the batch is full or the wait budget is spent."""
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while batch[-1] is not None and len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                # Drain whatever is already queued even once the budget is spent
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            # None is the close() sentinel; everything queued before it is in this batch or already done
+            closing = batch[-1] is None
+            if closing:
+                batch.pop()
+            if batch:
+                self._run(batch)
+            if closing:
+                return
+
+    def _run(self, batch: List[Tuple[np.ndarray, Future]]):
+        tiles = [tile for tile, _ in batch]
+        try:
+            outputs = self.run_batch(tiles)
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        with self._stats_lock:
+            self._batch_sizes[len(batch)] += 1
+        for (_, future), output in zip(batch, outputs):
+            future.set_result(output)
+
+    def close(self):
+        """Stop the worker thread once the queued tiles are done; later submits run inline."""
+        with self._submit_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+
+    def stats(self) -> Dict[str, Any]:
+        """Achieved batch sizes: number of forward passes, tiles, mean size and a size histogram."""
+        with self._stats_lock:
+            batches = sum(self._batch_sizes.values())
+            tiles = sum(size * count for size, count in self._batch_sizes.items())
+            return {
+                "batches": batches,
+                "tiles": tiles,
+                "mean_batch_size": round(tiles / batches, 2) if batches else 0.0,
+                "batch_size_histogram": dict(sorted(self._batch_sizes.items())),
+                "queued": self._queue.qsize(),
+            }
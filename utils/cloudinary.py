@@ -1,7 +1,5 @@
-import cloudinary
-import cloudinary.uploader
-import cloudinary.api
 import os
+import threading
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -11,8 +9,11 @@ load_dotenv()
 def initialize_cloudinary():
     """
     Initialize Cloudinary with credentials from environment variables.
-    This function should be called once when the app starts.
+    Called once, on the first upload, through get_cloudinary_client().
     """
+    import cloudinary
+    import cloudinary.uploader
+    import cloudinary.api
     cloudinary.config(
         cloud_name=os.getenv('CLOUDINARY_CLOUD_NAME'),
         api_key=os.getenv('CLOUDINARY_API_KEY'),
@@ -21,8 +22,18 @@ def initialize_cloudinary():
     )
     return cloudinary
 
-# Initialize the client
-cloudinary_client = initialize_cloudinary()
+# The client is created on first use so importing this module needs neither the SDK nor credentials
+_cloudinary_client = None
+_cloudinary_lock = threading.Lock()
+
+def get_cloudinary_client():
+    """Return the configured Cloudinary module, initializing it on first call."""
+    global _cloudinary_client
+    with _cloudinary_lock:
+        if _cloudinary_client is None:
+            _cloudinary_client = initialize_cloudinary()
+        return _cloudinary_client
+
 CLOUDINARY_FOLDER_NAME = os.getenv('CLOUDINARY_FOLDER_NAME', 'default_folder')
 
 # File management functions
@@ -50,7 +61,7 @@ def upload_file(file, folder=None, public_id=None):
         upload_options['public_id'] = public_id
     
     try:
-        result = cloudinary.uploader.upload(file, **upload_options)
+        result = get_cloudinary_client().uploader.upload(file, **upload_options)
         return {
             'success': True,
             'secure_url': result['secure_url'],
@@ -9,9 +9,12 @@ COST_PER_PIXEL = {
 }
 # --------------------------------------------------------------------------- #
 
+# "label" is the value used for the class in single-channel label maps (0 = background)
 DAMAGE_CLASSES = {
-    "no_damage":   {"bgr": (0, 255,   0), "count_key": "num_no_damage"},
-    "minor_damage":{"bgr": (0, 255, 255), "count_key": "num_minor_damage"},
-    "major_damage":{"bgr": (0, 165, 255), "count_key": "num_major_damage"},
-    "destroyed":   {"bgr": (0,   0, 255), "count_key": "num_destroyed"},
-}
\ No newline at end of file
+    "no_damage":   {"bgr": (0, 255,   0), "label": 1, "count_key": "num_no_damage"},
+    "minor_damage":{"bgr": (0, 255, 255), "label": 2, "count_key": "num_minor_damage"},
+    "major_damage":{"bgr": (0, 165, 255), "label": 3, "count_key": "num_major_damage"},
+    "destroyed":   {"bgr": (0,   0, 255), "label": 4, "count_key": "num_destroyed"},
+}
+
+UNKNOWN_BGR = (255, 255, 255)  # Colour of labels outside DAMAGE_CLASSES
\ No newline at end of file
@@ -0,0 +1,236 @@
+import time
+import uuid
+import threading
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Iterator, Optional
+
+from utils.metrics import metrics
+from utils.serving import iter_pair_results
+from utils.settings import JOB_WORKERS, JOB_STORE, JOB_TABLE, JOB_MAX_RETAINED
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+FINISHED_STATES = (JOB_COMPLETED, JOB_FAILED)
+
+PAIR_PENDING = "pending"
+PAIR_DONE = "done"
+
+
+# ------------------------------------------------------------------------
+# Job stores
+# ------------------------------------------------------------------------
+
+class JobStore:
+    """
+    Storage interface for async /predict jobs.
+
+    A job is a dict with ``id``, ``status``, ``pairs_total``, ``pairs_done``,
+    ``pair_status`` (one entry per pair), ``results`` (pair results in
+    order) and ``error``.
+    """
+
+    def create(self, job_id: str, pairs_total: int):
+        raise NotImplementedError
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def set_status(self, job_id: str, status: str, error: Optional[str] = None):
+        raise NotImplementedError
+
+    def append_result(self, job_id: str, result: Dict[str, Any]):
+        raise NotImplementedError
+
+    def wait_for_update(self, job_id: str, seen_results: int, timeout: float):
+        """Block until the job has more than ``seen_results`` results, finishes, or ``timeout`` passes."""
+        time.sleep(min(timeout, 1.0))
+
+    @staticmethod
+    def new_job(job_id: str, pairs_total: int) -> Dict[str, Any]:
+        return {
+            "id": job_id,
+            "status": JOB_QUEUED,
+            "pairs_total": pairs_total,
+            "pairs_done": 0,
+            "pair_status": [PAIR_PENDING] * pairs_total,
+            "results": [],
+            "error": None,
+        }
+
+
+class InMemoryJobStore(JobStore):
+    """Job store local to this worker process; keeps the most recent ``max_retained`` finished jobs."""
+
+    def __init__(self, max_retained: int = JOB_MAX_RETAINED):
+        self.max_retained = max_retained
+        self._jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._changed = threading.Condition()
+
+    def create(self, job_id: str, pairs_total: int):
+        with self._changed:
+            self._jobs[job_id] = self.new_job(job_id, pairs_total)
+            self._evict()
+
+    def _evict(self):
+        finished = [jid for jid, job in self._jobs.items() if job["status"] in FINISHED_STATES]
+        for job_id in finished[:max(0, len(finished) - self.max_retained)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._changed:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            return {**job, "pair_status": list(job["pair_status"]), "results": list(job["results"])}
+
+    def set_status(self, job_id: str, status: str, error: Optional[str] = None):
+        with self._changed:
+            job = self._jobs[job_id]
+            job["status"] = status
+            job["error"] = error
+            self._changed.notify_all()
+
+    def append_result(self, job_id: str, result: Dict[str, Any]):
+        with self._changed:
+            job = self._jobs[job_id]
+            job["results"].append(result)
+            job["pair_status"][result["pair_index"]] = PAIR_DONE
+            job["pairs_done"] += 1
+            self._changed.notify_all()
+
+    def wait_for_update(self, job_id: str, seen_results: int, timeout: float):
+        with self._changed:
+            self._changed.wait_for(
+                lambda: job_id not in self._jobs
+                or len(self._jobs[job_id]["results"]) > seen_results
+                or self._jobs[job_id]["status"] in FINISHED_STATES,
+                timeout=timeout,
+            )
+
+
+class SupabaseJobStore(JobStore):
+    """
+    Job store backed by a Supabase table, shared by every worker and replica.
+
+    Expects a table (``JOB_TABLE``) with columns ``id`` (text), ``status``,
+    ``pairs_total``, ``pairs_done``, ``pair_status`` (json), ``results``
+    (json) and ``error``.
+    """
+
+    def __init__(self, table_name: str = JOB_TABLE):
+        # Imported here so the Supabase client is only created when this store is used
+        from utils.supabase_utils import get_new_supabase_client
+        self._client = get_new_supabase_client
+        self.table_name = table_name
+
+    def _table(self):
+        return self._client().table(self.table_name)
+
+    def create(self, job_id: str, pairs_total: int):
+        self._table().insert(self.new_job(job_id, pairs_total)).execute()
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        # No matching row is an empty ``data`` list, not an error
+        rows = self._table().select("*").eq("id", job_id).execute().data
+        return rows[0] if rows else None
+
+    def _update(self, job_id: str, values: Dict[str, Any]):
+        self._table().update(values).eq("id", job_id).execute()
+
+    def set_status(self, job_id: str, status: str, error: Optional[str] = None):
+        self._update(job_id, {"status": status, "error": error})
+
+    def append_result(self, job_id: str, result: Dict[str, Any]):
+        # Only the job's worker thread writes to its row, so read-modify-write is safe
+        job = self.get(job_id)
+        job["results"].append(result)
+        job["pair_status"][result["pair_index"]] = PAIR_DONE
+        self._update(job_id, {
+            "results": job["results"],
+            "pair_status": job["pair_status"],
+            "pairs_done": job["pairs_done"] + 1,
+        })
+
+
+def create_job_store(kind: str = JOB_STORE) -> JobStore:
+    """Build the job store selected by ``JOB_STORE``."""
+    if kind == "memory":
+        return InMemoryJobStore()
+    if kind == "supabase":
+        return SupabaseJobStore()
+    raise ValueError(f"Unknown job store '{kind}', expected 'memory' or 'supabase'")
+
+
+# ------------------------------------------------------------------------
+# Job execution
+# ------------------------------------------------------------------------
+
+class JobManager:
+    """Runs /predict jobs on a background worker pool and records per-pair progress."""
+
+    def __init__(self, store: JobStore, max_workers: int = JOB_WORKERS):
+        self.store = store
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+
+    def submit(self, image_pairs: List[Dict[str, str]], postprocessing: str) -> str:
+        """Queue a job and return its ID immediately."""
+        job_id = uuid.uuid4().hex
+        self.store.create(job_id, len(image_pairs))
+        self._executor.submit(self._run, job_id, image_pairs, postprocessing)
+        return job_id
+
+    def _run(self, job_id: str, image_pairs: List[Dict[str, str]], postprocessing: str):
+        self.store.set_status(job_id, JOB_RUNNING)
+        try:
+            with metrics.timed("job"):
+                for result in iter_pair_results(image_pairs, postprocessing):
+                    self.store.append_result(job_id, result.to_dict())
+        except Exception as e:
+            traceback.print_exc()
+            self.store.set_status(job_id, JOB_FAILED, error=str(e))
+            return
+        self.store.set_status(job_id, JOB_COMPLETED)
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Job progress without the results themselves."""
+        job = self.store.get(job_id)
+        if job is None:
+            return None
+        return {key: value for key, value in job.items() if key != "results"}
+
+    def results(self, job_id: str, since: int = 0) -> Optional[Dict[str, Any]]:
+        """Pair results from index ``since`` onwards, for incremental polling."""
+        job = self.store.get(job_id)
+        if job is None:
+            return None
+        results = job["results"][since:]
+        return {
+            "id": job_id,
+            "status": job["status"],
+            "results": results,
+            "next": since + len(results),
+            "error": job["error"],
+        }
+
+    def stream(self, job_id: str, poll_timeout: float = 15.0) -> Iterator[Dict[str, Any]]:
+        """Yield pair results as they finish, then a final status record."""
+        seen = 0
+        while True:
+            job = self.store.get(job_id)
+            if job is None:
+                return
+            for result in job["results"][seen:]:
+                yield result
+            seen = len(job["results"])
+            if job["status"] in FINISHED_STATES:
+                yield {"id": job_id, "status": job["status"], "error": job["error"]}
+                return
+            self.store.wait_for_update(job_id, seen, poll_timeout)
+
+
+# Shared by all requests handled by this worker process
+job_manager = JobManager(create_job_store())
@@ -0,0 +1,192 @@
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Log-spaced latency buckets (0.5 ms .. ~2 min, x1.25 per step); fine enough for p50/p95/p99
+LATENCY_BUCKETS: Tuple[float, ...] = tuple(round(0.0005 * 1.25 ** i, 6) for i in range(57))
+QUANTILES = (0.5, 0.95, 0.99)
+
+STAGE_METRIC = "inference_stage_seconds"
+COUNTER_HELP = {
+    "inference_images_total": "Images run through a model",
+    "inference_tiles_total": "Model tiles inferred",
+    "inference_tiles_skipped_total": "Tiles not sent to a model, by reason",
+    "inference_download_bytes_total": "Bytes of source images downloaded",
+    "inference_upload_bytes_total": "Bytes of mask PNGs uploaded",
+    "inference_errors_total": "Failures per stage",
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """Fixed-bucket latency histogram; observing is a bisect and two additions."""
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Estimate a quantile by interpolating inside the bucket that contains it."""
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - seen) / n
+            seen += n
+        return self.buckets[-1]
+
+
+def _bucket_labels(h: Histogram) -> List[str]:
+    return [f"{bound:g}" for bound in h.buckets] + ["+Inf"]
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _format_labels(labels: Labels, **extra: str) -> str:
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in pairs) + "}"
+
+
+class Metrics:
+    """
+    Process-wide latency histograms per serving stage plus labelled counters.
+
+    Stages are timed with ``timed`` (or ``observe`` for durations measured
+    elsewhere, e.g. in an inference worker process) and exported in the
+    Prometheus text format by ``render``.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages: Dict[str, Histogram] = {}
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+
+    def observe(self, stage: str, seconds: float):
+        with self._lock:
+            histogram = self._stages.get(stage)
+            if histogram is None:
+                histogram = self._stages[stage] = Histogram()
+            histogram.observe(seconds)
+
+    def observe_many(self, timings: Dict[str, float]):
+        for stage, seconds in timings.items():
+            self.observe(stage, seconds)
+
+    def inc(self, name: str, amount: float = 1, **labels: str):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def counter_values(self) -> Dict[Tuple[str, Labels], float]:
+        """Snapshot of every counter, e.g. to send a worker process's increments back."""
+        with self._lock:
+            return dict(self._counters)
+
+    def add_counters(self, increments: Dict[Tuple[str, Labels], float]):
+        """Add increments counted elsewhere (see ``counter_values``)."""
+        with self._lock:
+            for key, amount in increments.items():
+                self._counters[key] = self._counters.get(key, 0) + amount
+
+    @contextmanager
+    def timed(self, stage: str, into: Optional[Dict[str, float]] = None) -> Iterator[None]:
+        """
+        Time the enclosed block as ``stage`` and count it in ``inference_errors_total`` if it raises.
+
+        The duration is also added to ``into`` if given, e.g. so an inference
+        worker process can send its timings back to the front end.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.inc("inference_errors_total", stage=stage)
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            self.observe(stage, elapsed)
+            if into is not None:
+                into[stage] = into.get(stage, 0.0) + elapsed
+
+    def stage_summary(self) -> Dict[str, Dict[str, float]]:
+        """Count, mean and p50/p95/p99 in seconds for every stage."""
+        with self._lock:
+            return {
+                stage: {
+                    "count": h.count,
+                    "mean": h.sum / h.count if h.count else 0.0,
+                    **{f"p{int(q * 100)}": h.quantile(q) for q in QUANTILES},
+                }
+                for stage, h in sorted(self._stages.items())
+            }
+
+    def render(self, extra_lines: Optional[List[str]] = None) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        lines = [
+            f"# HELP {STAGE_METRIC} Time spent in each serving stage",
+            f"# TYPE {STAGE_METRIC} histogram",
+        ]
+        quantile_lines = []
+        with self._lock:
+            for stage, h in sorted(self._stages.items()):
+                labels = (("stage", stage),)
+                cumulative = 0
+                for bound, n in zip(_bucket_labels(h), h.counts):
+                    cumulative += n
+                    lines.append(f"{STAGE_METRIC}_bucket{_format_labels(labels, le=bound)} {cumulative}")
+                lines.append(f"{STAGE_METRIC}_sum{_format_labels(labels)} {h.sum:.6f}")
+                lines.append(f"{STAGE_METRIC}_count{_format_labels(labels)} {h.count}")
+                for q in QUANTILES:
+                    quantile_lines.append(
+                        f"{STAGE_METRIC}_quantile{_format_labels(labels, quantile=str(q))} {h.quantile(q):.6f}")
+
+            lines += [
+                f"# HELP {STAGE_METRIC}_quantile Stage latency quantiles estimated from the histogram",
+                f"# TYPE {STAGE_METRIC}_quantile gauge",
+            ] + quantile_lines
+
+            by_name: Dict[str, List[Tuple[Labels, float]]] = {}
+            for (name, labels), value in sorted(self._counters.items()):
+                by_name.setdefault(name, []).append((labels, value))
+        for name, series in by_name.items():
+            lines.append(f"# HELP {name} {COUNTER_HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} counter")
+            lines += [f"{name}{_format_labels(labels)} {_format_value(value)}" for labels, value in series]
+
+        return "\n".join(lines + (extra_lines or [])) + "\n"
+
+    def clear(self):
+        with self._lock:
+            self._stages.clear()
+            self._counters.clear()
+
+
+def gauge_lines(name: str, help_text: str, series: List[Tuple[Dict[str, str], float]],
+                kind: str = "gauge") -> List[str]:
+    """Prometheus lines for values owned elsewhere (cache and batching stats)."""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    for labels, value in series:
+        lines.append(f"{name}{_format_labels(tuple(sorted(labels.items())))} {_format_value(value)}")
+    return lines
+
+
+# Shared by all requests handled by this worker process
+metrics = Metrics()
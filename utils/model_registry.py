@@ -0,0 +1,182 @@
+import os
+import hashlib
+import threading
+import numpy as np
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from utils.perform_inference import Config, YoloInference, Postprocessor
+from utils.settings import (
+    MODEL_REGISTRY_HASH_WEIGHTS, TILING_MODE, TILE_OVERLAP, TILE_FILTER, TILE_FILTER_THRESHOLD,
+    MASK_ASSEMBLY, MASK_OVERLAP,
+    MICRO_BATCHING, MICRO_BATCH_MAX_SIZE, MICRO_BATCH_MAX_WAIT_MS,
+)
+
+# ------------------------------------------------------------------------
+# Loaded models
+# ------------------------------------------------------------------------
+
+@dataclass
+class LoadedModel:
+    """A model loaded once per worker together with its pipeline components."""
+    config: Config
+    model: YoloInference
+    postprocessor: Postprocessor
+    fingerprint: Tuple
+
+
+def _hash_file(path: str, chunk_size: int = 1 << 20) -> str:
+    """Return the SHA-256 of a file without reading it into memory at once."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ModelRegistry:
+    """
+    Process-wide cache of loaded YOLO models.
+
+    Each weight file is loaded once and shared by every request. Entries are
+    keyed by resolved path and file fingerprint (mtime/size, or content hash
+    when ``hash_weights`` is set), so a weight file replaced on disk, or a
+    serving symlink pointed at a new version, is reloaded on the next lookup.
+    Requests holding the previous entry finish on it.
+    """
+
+    def __init__(self, hash_weights: bool = MODEL_REGISTRY_HASH_WEIGHTS,
+                 model_factory: Optional[Callable[[str], Any]] = None,
+                 micro_batching: bool = MICRO_BATCHING):
+        self.hash_weights = hash_weights
+        # Off in inference pool workers, which run one pair at a time and have nothing to merge
+        self.micro_batching = micro_batching
+        # Builds the model object for a weight file (default: ultralytics YOLO); benchmarks swap in stand-ins
+        self.model_factory = model_factory
+        self._entries: Dict[str, LoadedModel] = {}
+        self._hashes: Dict[str, Tuple[Tuple[int, int], Tuple]] = {}
+        self._resolved: Dict[str, str] = {}  # requested path -> resolved weight file
+        self._lock = threading.Lock()
+
+    def _fingerprint(self, path: str) -> Tuple:
+        """Cheap file identity, upgraded to a content hash if configured."""
+        st = os.stat(path)
+        stat_key = (st.st_mtime_ns, st.st_size)
+        if not self.hash_weights:
+            return (path,) + stat_key
+
+        # Only re-hash when the file metadata changed
+        cached = self._hashes.get(path)
+        if cached is not None and cached[0] == stat_key:
+            return cached[1]
+        fingerprint = (path, _hash_file(path))
+        self._hashes[path] = (stat_key, fingerprint)
+        return fingerprint
+
+    @staticmethod
+    def build_config(model_path: str) -> Config:
+        """Serving configuration for a weight file."""
+        config = Config.default_config()
+        config.model_path = model_path
+        config.skip_save = True
+        config.tiling = TILING_MODE
+        config.tile_overlap = TILE_OVERLAP
+        config.tile_filter = TILE_FILTER or None
+        config.tile_filter_threshold = float(TILE_FILTER_THRESHOLD) if TILE_FILTER_THRESHOLD else None
+        config.mask_assembly = MASK_ASSEMBLY
+        config.mask_overlap = MASK_OVERLAP
+        return config
+
+    def identity(self, model_path: str) -> Dict[str, Any]:
+        """Everything that determines a model's output, without loading it."""
+        with self._lock:
+            fingerprint = self._fingerprint(os.path.realpath(model_path))
+        config = self.build_config(model_path)
+        return {
+            "model": fingerprint,
+            "conf_threshold": config.conf_threshold,
+            "tile_size": config.tile_size,
+            "tiling": config.tiling,
+            "tile_overlap": config.tile_overlap,
+            "tile_filter": config.tile_filter,
+            "tile_filter_threshold": config.tile_filter_threshold,
+            "mask_assembly": config.mask_assembly,
+            "mask_overlap": config.mask_overlap,
+        }
+
+    def _load(self, model_path: str, fingerprint: Tuple) -> LoadedModel:
+        """Build the inference components for a weight file."""
+        config = self.build_config(model_path)
+        config.create_directories()
+
+        print(f"Loading model {model_path}...")
+        model = YoloInference(config, self.model_factory(model_path) if self.model_factory else None)
+        if self.micro_batching:
+            model.enable_micro_batching(MICRO_BATCH_MAX_SIZE, MICRO_BATCH_MAX_WAIT_MS)
+        return LoadedModel(
+            config=config,
+            model=model,
+            postprocessor=Postprocessor(config),
+            fingerprint=fingerprint,
+        )
+
+    def get(self, model_path: str) -> LoadedModel:
+        """Return the loaded model for ``model_path``, loading it on first use."""
+        with self._lock:
+            real_path = os.path.realpath(model_path)
+            fingerprint = self._fingerprint(real_path)
+            entry = self._entries.get(real_path)
+            if entry is None or entry.fingerprint != fingerprint:
+                if entry is not None:
+                    self._retire(entry)
+                entry = self._load(real_path, fingerprint)
+                self._entries[real_path] = entry
+
+            requested = os.path.abspath(model_path)
+            previous = self._resolved.get(requested)
+            self._resolved[requested] = real_path
+            if previous is not None and previous != real_path and not any(
+                    real == previous for path, real in self._resolved.items() if path != previous):
+                # The path now points at another version; drop the one no other path refers to
+                if previous != requested:
+                    self._resolved.pop(previous, None)
+                old = self._entries.pop(previous, None)
+                if old is not None:
+                    self._retire(old)
+            return entry
+
+    @staticmethod
+    def _retire(entry: LoadedModel):
+        """Release a superseded model once in-flight requests are done with it."""
+        if entry.model.batcher is not None:
+            entry.model.batcher.close()
+        print(f"Retired model {entry.config.model_path}")
+
+    def warm_up(self, model_paths: Iterable[str]):
+        """Load each model and run a blank tile through it to pay cold-start costs."""
+        for model_path in model_paths:
+            entry = self.get(model_path)
+            tile_size = entry.config.tile_size
+            blank = np.zeros((tile_size, tile_size, 3), dtype=np.uint8)
+            entry.model.generate_prediction_mask(blank, "warmup")
+            print(f"Warmed up {model_path}")
+
+    def batching_stats(self) -> Dict[str, Dict]:
+        """Micro-batching statistics of every loaded model, keyed by model path."""
+        with self._lock:
+            entries = dict(self._entries)
+        return {path: entry.model.batcher.stats()
+                for path, entry in entries.items() if entry.model.batcher is not None}
+
+    def clear(self):
+        """Drop every loaded model."""
+        with self._lock:
+            for entry in self._entries.values():
+                self._retire(entry)
+            self._entries.clear()
+            self._hashes.clear()
+            self._resolved.clear()
+
+
+# Shared by all requests handled by this worker process
+model_registry = ModelRegistry()
@@ -1,20 +1,30 @@
 import os
-import shutil
 import cv2
 import numpy as np
-import matplotlib.pyplot as plt
 from pathlib import Path
-from ultralytics import YOLO
-from scipy.ndimage import label
 import yaml
 import time
+import threading
+import itertools
+from collections import deque
+from contextlib import nullcontext
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
 from dataclasses import dataclass
-from typing import Dict, List, Tuple, Optional, Any, Union
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple, Optional, Any, Union
+
+from utils.constants import DAMAGE_CLASSES, UNKNOWN_BGR
+from utils.metrics import metrics
 
 # ------------------------------------------------------------------------
 # Configuration
 # ------------------------------------------------------------------------
 MODEL_PATH = "./models/best_256_new.pt"  # Default model path
+POSTPROCESSING_MODES = ("morphology", "majority_vote")
+TILING_MODES = ("grid", "padded")
+VIS_BACKENDS = ("opencv", "matplotlib")
+MASK_ASSEMBLY_MODES = ("polygon", "raster")
+MASK_OVERLAP_RULES = ("last", "confidence")
 
 
 @dataclass
@@ -26,7 +36,6 @@ class Config:
     model_path: str
     output_dir: str
     vis_dir: str
-    temp_dir: str
     
     # Process settings
     save_interval: int
@@ -39,6 +48,29 @@ class Config:
     color_map: Dict[int, Tuple[int, int, int]]
     color_map_inverse: Dict[Tuple[int, int, int], int]
     
+    # Inference settings (defaults keep older YAML configs loadable)
+    batch_size: int = 16  # Tiles sent to the model per forward pass
+    postprocessing: str = "morphology"  # One of POSTPROCESSING_MODES
+    tiling: str = "padded"  # "grid" drops partial edge tiles, "padded" zero-pads them
+    tile_overlap: int = 0  # Pixels shared by neighbouring tiles ("padded" mode only)
+    tile_filter: Optional[str] = None  # Pre-filter from TILE_FILTERS; tiles scoring below the threshold are not run
+    tile_filter_threshold: Optional[float] = None  # None uses the filter's default
+    mask_assembly: str = "polygon"  # One of MASK_ASSEMBLY_MODES; "raster" paints the model's instance masks directly
+    mask_overlap: str = "last"  # One of MASK_OVERLAP_RULES; where instances overlap, the later / more confident wins
+    
+    # Visualisation settings
+    vis_backend: str = "opencv"  # One of VIS_BACKENDS; "matplotlib" draws the original 300-dpi figures
+    vis_alpha: float = 0.5  # Opacity of the prediction overlay panel (0 leaves the panel out)
+    
+    # Batch mode settings (DamageSegmentationPipeline.run)
+    workers: int = 0  # Load and post-process/save threads (0 processes one image at a time)
+    prefetch: int = 4  # Images loaded ahead of the model in parallel mode
+    skip_existing: bool = False  # Resume: skip images whose prediction mask is already saved (needs skip_save off)
+    
+    # Streaming (large-scene) settings
+    stream_block_size: int = 2048  # Output block written per step
+    stream_halo: int = 64  # Context read around each block so post-processing sees its neighbours
+    
     @classmethod
     def load_from_yaml(cls, config_path: str) -> 'Config':
         """Load configuration from YAML file."""
@@ -53,6 +85,8 @@ class Config:
             color_map_inverse[color_tuple] = v
         
         config_data['color_map_inverse'] = color_map_inverse
+        # Configs saved while tiles were still staged on disk carry an unused temp_dir
+        config_data.pop('temp_dir', None)
         
         return cls(**config_data)
     
@@ -65,7 +99,6 @@ class Config:
             model_path=MODEL_PATH,
             output_dir="./inference/predictions_256_damage_assesment_postprocessing_final",
             vis_dir="./inference/visualization_256_damage_assesment_postprocessing_final",
-            temp_dir="./inference/temp_tiles",
             
             save_interval=50,
             conf_threshold=0.1,
@@ -73,24 +106,52 @@ class Config:
             tile_size=256,
             ground_truth=False,  # Default to not saving ground truth
             
-            color_map={
-                0: (0, 255, 0),    # Green (No damage)
-                1: (0, 255, 255),  # Yellow (Minor damage)
-                2: (0, 165, 255),  # Orange (Major damage)
-                3: (0, 0, 255)     # Red (Destroyed)
-            },
+            # Class ID = label - 1 for every damage class, so label maps mean the same everywhere
+            color_map={info["label"] - 1: info["bgr"] for info in DAMAGE_CLASSES.values()},
             color_map_inverse={
-                (0, 255, 0): 0,
-                (0, 255, 255): 1,
-                (0, 165, 255): 2,
-                (0, 0, 255): 3,
-                (255, 255, 255): 4  # "Unknown" class
-            }
+                **{info["bgr"]: info["label"] - 1 for info in DAMAGE_CLASSES.values()},
+                UNKNOWN_BGR: len(DAMAGE_CLASSES),  # "Unknown" class
+            },
+            
+            batch_size=16,
+            postprocessing="morphology",
+            tiling="padded",
+            tile_overlap=0,
+            tile_filter=None,
+            tile_filter_threshold=None,
+            mask_assembly="polygon",
+            mask_overlap="last",
+            vis_backend="opencv",
+            vis_alpha=0.5,
+            workers=0,
+            prefetch=4,
+            skip_existing=False,
+            stream_block_size=2048,
+            stream_halo=64
         )
 
+    def class_to_label(self, class_id: int) -> int:
+        """Map a model class ID to its value in a label map (0 is background)."""
+        if class_id not in self.color_map:
+            # Classes without a colour share the "unknown" label
+            class_id = self.color_map_inverse.get(UNKNOWN_BGR, len(self.color_map))
+        return class_id + 1
+    
+    def label_palette(self) -> np.ndarray:
+        """Lookup table turning a label map into a BGR colour mask."""
+        palette = np.full((256, 3), UNKNOWN_BGR, dtype=np.uint8)
+        palette[0] = 0
+        for class_id, color in self.color_map.items():
+            palette[class_id + 1] = color
+        return palette
+    
+    def colorize(self, label_map: np.ndarray) -> np.ndarray:
+        """Convert a label map into a BGR colour mask for saving or display."""
+        return self.label_palette()[label_map]
+
     def create_directories(self):
         """Create all necessary directories."""
-        for directory in [self.temp_dir, self.output_dir, self.vis_dir]:
+        for directory in [self.output_dir, self.vis_dir]:
             os.makedirs(directory, exist_ok=True)
         
     def save_to_yaml(self, output_path: str):
@@ -130,9 +191,9 @@ class DataHandler:
         return image
     
     def create_ground_truth_mask(self, base_name: str, height: int, width: int) -> Optional[np.ndarray]:
-        """Create ground truth mask from annotation file."""
+        """Create ground truth label map from annotation file."""
         annotation_path = os.path.join(self.config.labels_dir, f"{base_name}.txt")
-        gt_mask = np.zeros((height, width, 3), dtype=np.uint8)
+        gt_mask = np.zeros((height, width), dtype=np.uint8)
         
         if not os.path.exists(annotation_path):
             return None
@@ -152,27 +213,228 @@ class DataHandler:
                 x_pix, y_pix = int(x_norm * width), int(y_norm * height)
                 points.append((x_pix, y_pix))
             
-            # Fill polygon with appropriate color
+            # Fill polygon with the class label
             points = np.array(points, dtype=np.int32)
-            color = self.config.color_map.get(cls, (255, 255, 255))
-            cv2.fillPoly(gt_mask, [points], color)
+            cv2.fillPoly(gt_mask, [points], self.config.class_to_label(cls))
         
         return gt_mask
     
+    def prediction_path(self, base_name: str) -> str:
+        """Path of the prediction mask written for an image."""
+        return os.path.join(self.config.output_dir, f"{base_name}_pred_mask.png")
+    
+    def has_outputs(self, base_name: str) -> bool:
+        """Whether an image was already fully processed (its prediction mask is written last)."""
+        return os.path.exists(self.prediction_path(base_name))
+    
+    @staticmethod
+    def _write_image(path: str, image: np.ndarray):
+        """Write an image via a temporary file, so an interrupted run never leaves a partial output."""
+        root, ext = os.path.splitext(path)
+        tmp_path = f"{root}.tmp{ext}"
+        cv2.imwrite(tmp_path, image)
+        os.replace(tmp_path, path)
+    
     def save_masks(self, pred_mask: np.ndarray, base_name: str, gt_mask: Optional[np.ndarray] = None):
-        """Save prediction mask and optionally ground truth mask to output directory."""
-        # Always save prediction mask
-        pred_path = os.path.join(self.config.output_dir, f"{base_name}_pred_mask.png")
-        cv2.imwrite(pred_path, pred_mask)
-        
+        """Save prediction mask and optionally ground truth mask to output directory as colour images."""
         # Save ground truth only if it's provided and the config flag is set
         if self.config.ground_truth and gt_mask is not None:
             gt_path = os.path.join(self.config.output_dir, f"{base_name}_gt_mask.png")
-            cv2.imwrite(gt_path, gt_mask)
-    
-    def cleanup(self):
-        """Clean up temporary files."""
-        shutil.rmtree(self.config.temp_dir, ignore_errors=True)
+            self._write_image(gt_path, self.config.colorize(gt_mask))
+        
+        # Always save prediction mask, last, so its presence marks the image as done
+        self._write_image(self.prediction_path(base_name), self.config.colorize(pred_mask))
+
+
+# ------------------------------------------------------------------------
+# Tiling
+# ------------------------------------------------------------------------
+
+@dataclass(frozen=True)
+class Tile:
+    """A model tile and the region of the image whose prediction it owns."""
+    y: int
+    x: int
+    core_y1: int
+    core_y2: int
+    core_x1: int
+    core_x2: int
+
+
+def _axis_tiles(length: int, tile_size: int, stride: int, pad: bool) -> List[Tuple[int, int, int]]:
+    """Return (start, core_start, core_end) for each tile along one axis."""
+    if not pad:
+        return [(i * tile_size, i * tile_size, (i + 1) * tile_size) for i in range(length // tile_size)]
+    if length <= 0:
+        return []
+
+    starts = [0]
+    while starts[-1] + tile_size < length:
+        starts.append(starts[-1] + stride)
+
+    # Neighbouring tiles split their overlap at its midpoint, so every pixel
+    # is owned by exactly one tile: the one it is most central in
+    bounds = [0]
+    for prev, nxt in zip(starts, starts[1:]):
+        bounds.append((nxt + prev + tile_size) // 2)
+    bounds.append(length)
+    return [(start, bounds[i], bounds[i + 1]) for i, start in enumerate(starts)]
+
+
+@lru_cache(maxsize=64)
+def compute_tile_schedule(height: int, width: int, tile_size: int,
+                          overlap: int = 0, tiling: str = "padded") -> Tuple[Tile, ...]:
+    """
+    Precompute the tiles covering an image of the given size.
+
+    ``grid`` reproduces the original behaviour (whole tiles only, partial
+    right/bottom strips are skipped). ``padded`` covers the full image, with
+    neighbouring tiles sharing ``overlap`` pixels and edge tiles zero-padded.
+    Schedules are cached per image size.
+    """
+    if tiling not in TILING_MODES:
+        raise ValueError(f"Unknown tiling mode '{tiling}', expected one of {TILING_MODES}")
+    if not 0 <= overlap < tile_size:
+        raise ValueError(f"tile_overlap must be in [0, {tile_size}), got {overlap}")
+
+    pad = tiling == "padded"
+    stride = tile_size - overlap if pad else tile_size
+    rows = _axis_tiles(height, tile_size, stride, pad)
+    cols = _axis_tiles(width, tile_size, stride, pad)
+    return tuple(Tile(y, x, cy1, cy2, cx1, cx2) for y, cy1, cy2 in rows for x, cx1, cx2 in cols)
+
+
+def extract_tile(image: np.ndarray, tile: Tile, tile_size: int) -> np.ndarray:
+    """Return the tile as a view into ``image``, or a zero-padded copy at the image edges."""
+    view = image[tile.y:tile.y + tile_size, tile.x:tile.x + tile_size]
+    if view.shape[0] == tile_size and view.shape[1] == tile_size:
+        return view
+    padded = np.zeros((tile_size, tile_size) + image.shape[2:], dtype=image.dtype)
+    padded[:view.shape[0], :view.shape[1]] = view
+    return padded
+
+
+def tiles_with_footprint(tiles: Sequence[Tile], footprint: np.ndarray) -> List[Tile]:
+    """
+    Keep the tiles whose core contains at least one footprint pixel.
+
+    Uses one integral image of the footprint, so each tile costs four lookups.
+    """
+    if not tiles:
+        return []
+    integral = cv2.integral((footprint > 0).astype(np.uint8))
+    cores = np.array([(t.core_y1, t.core_y2, t.core_x1, t.core_x2) for t in tiles], dtype=np.intp)
+    y1, y2, x1, x2 = cores.T
+    covered = integral[y2, x2] - integral[y1, x2] - integral[y2, x1] + integral[y1, x1]
+    return [tile for tile, n in zip(tiles, covered) if n > 0]
+
+
+# ------------------------------------------------------------------------
+# Mask assembly
+# ------------------------------------------------------------------------
+
+def _to_numpy(values: Any) -> np.ndarray:
+    """Array from a torch tensor (on any device) or anything array-like."""
+    if hasattr(values, "cpu"):
+        values = values.cpu().numpy()
+    return np.asarray(values)
+
+
+def composite_instance_masks(masks: np.ndarray, labels: np.ndarray) -> np.ndarray:
+    """
+    Paint (N, H, W) boolean instance masks into one label map in a single pass.
+
+    Each pixel takes the label (non-zero) of the last instance covering it,
+    as when the instances are filled one after the other; 0 where none does.
+    """
+    count = masks.shape[0]
+    if count > 255:
+        # Instance indices must fit in uint8: composite in chunks, later chunks on top (labels are never 0)
+        out = composite_instance_masks(masks[:255], labels[:255])
+        for start in range(255, count, 255):
+            chunk = composite_instance_masks(masks[start:start + 255], labels[start:start + 255])
+            np.copyto(out, chunk, where=chunk > 0)
+        return out
+
+    # 1-based index of the last instance covering each pixel
+    indices = masks.astype(np.uint8)
+    indices *= np.arange(1, count + 1, dtype=np.uint8)[:, None, None]
+    # Table lookup is several times faster than fancy indexing
+    lookup = np.zeros(256, dtype=np.uint8)
+    lookup[1:count + 1] = labels
+    return cv2.LUT(indices.max(axis=0), lookup)
+
+
+def unletterbox(label_map: np.ndarray, shape: Tuple[int, int]) -> np.ndarray:
+    """
+    Map a label map at the model's input resolution back onto the tile.
+
+    YOLO letterboxes its input (scaled to fit, padded to the input size), so
+    the padding is cropped off and the rest resized to ``shape`` (nearest neighbour).
+    """
+    mask_h, mask_w = label_map.shape[:2]
+    height, width = shape
+    if (mask_h, mask_w) == (height, width):
+        return label_map
+    gain = min(mask_h / height, mask_w / width)
+    pad_x, pad_y = (mask_w - width * gain) / 2, (mask_h - height * gain) / 2
+    # Same rounding as ultralytics' scale_image
+    top, left = int(round(pad_y - 0.1)), int(round(pad_x - 0.1))
+    bottom, right = int(round(mask_h - pad_y + 0.1)), int(round(mask_w - pad_x + 0.1))
+    return cv2.resize(np.ascontiguousarray(label_map[top:bottom, left:right]), (width, height),
+                      interpolation=cv2.INTER_NEAREST)
+
+
+# ------------------------------------------------------------------------
+# Tile pre-filters
+# ------------------------------------------------------------------------
+# Each filter scores a stack of tiles (N, tile_size, tile_size, 3) at once and
+# returns one score per tile; tiles scoring below the threshold are not sent to
+# the model. Add an entry to TILE_FILTERS (and a default threshold) to plug in
+# another one.
+
+def _gray_histograms(tiles: np.ndarray) -> np.ndarray:
+    """
+    Normalised 256-bin grey-level histogram of every tile in a stack, (N, 256).
+
+    One colour conversion over the whole stack and one bincount; every other
+    pixel is sampled, which is plenty for gating tiles.
+    """
+    n, height, width = tiles.shape[:3]
+    gray = cv2.cvtColor(tiles.reshape(n * height, width, -1), cv2.COLOR_BGR2GRAY).reshape(n, height, width)
+    sample = gray[:, ::2, ::2].reshape(n, -1)
+    offsets = (np.arange(n, dtype=np.int64) * 256)[:, None]
+    hist = np.bincount((sample + offsets).ravel(), minlength=n * 256).reshape(n, 256)
+    return hist / sample.shape[1]
+
+
+def tile_variance(tiles: np.ndarray) -> np.ndarray:
+    """Grey-level variance of each tile; flat water, fields and padding score near 0."""
+    p = _gray_histograms(tiles)
+    levels = np.arange(256, dtype=np.float64)
+    mean = p @ levels
+    return p @ (levels ** 2) - mean ** 2
+
+
+def tile_entropy(tiles: np.ndarray) -> np.ndarray:
+    """Shannon entropy (bits, 0-8) of each tile's grey-level histogram."""
+    p = _gray_histograms(tiles)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(p > 0, -p * np.log2(p), 0.0).sum(axis=1)
+
+
+def tile_valid_fraction(tiles: np.ndarray) -> np.ndarray:
+    """Fraction of pixels that are not nodata (pure black, as padding and most nodata borders are)."""
+    valid = tiles[..., 0] | tiles[..., 1] | tiles[..., 2]
+    return np.count_nonzero(valid.reshape(len(tiles), -1), axis=1) / valid[0].size
+
+
+TILE_FILTERS: Dict[str, Callable[[np.ndarray], np.ndarray]] = {
+    "variance": tile_variance,
+    "entropy": tile_entropy,
+    "nodata": tile_valid_fraction,
+}
+DEFAULT_TILE_FILTER_THRESHOLDS = {"variance": 25.0, "entropy": 1.0, "nodata": 0.01}
 
 
 # ------------------------------------------------------------------------
@@ -182,57 +444,163 @@ class DataHandler:
 class YoloInference:
     """Class to handle YOLO model inference."""
     
-    def __init__(self, config: Config):
-        """Initialize with configuration."""
+    def __init__(self, config: Config, model: Optional[Any] = None):
+        """Initialize with configuration, loading ``config.model_path`` unless a ``model`` is given."""
         self.config = config
-        self.model = YOLO(config.model_path)
+        if model is None:
+            # Imported on first model load so importing this module (e.g. the web front end) stays fast
+            from ultralytics import YOLO
+            model = YOLO(config.model_path)
+        # Anything with YOLO's predict(list_of_tiles, conf=..., verbose=...) interface
+        self.model = model
+        # Ultralytics predictors are not thread-safe; the model may be shared across requests
+        self._predict_lock = threading.Lock()
+        self.batcher = None
+        
+        # Optional tile pre-filter
+        self.tile_filter: Optional[Callable[[np.ndarray], np.ndarray]] = None
+        self.tile_filter_threshold = 0.0
+        if config.tile_filter:
+            if config.tile_filter not in TILE_FILTERS:
+                raise ValueError(f"Unknown tile filter '{config.tile_filter}', expected one of {tuple(TILE_FILTERS)}")
+            self.tile_filter = TILE_FILTERS[config.tile_filter]
+            self.tile_filter_threshold = (DEFAULT_TILE_FILTER_THRESHOLDS.get(config.tile_filter, 0.0)
+                                          if config.tile_filter_threshold is None else config.tile_filter_threshold)
+        
+        if config.mask_assembly not in MASK_ASSEMBLY_MODES:
+            raise ValueError(f"Unknown mask assembly '{config.mask_assembly}', expected one of {MASK_ASSEMBLY_MODES}")
+        if config.mask_overlap not in MASK_OVERLAP_RULES:
+            raise ValueError(f"Unknown mask overlap rule '{config.mask_overlap}', expected one of {MASK_OVERLAP_RULES}")
     
-    def process_tile(self, tile: np.ndarray, tile_path: str, x_offset: int, y_offset: int) -> np.ndarray:
-        """Process a single tile and return mask with predictions."""
-        mask = np.zeros_like(tile)
+    def enable_micro_batching(self, max_batch_size: int, max_wait_ms: float):
+        """Route tiles through a MicroBatcher so concurrent callers share forward passes."""
+        from utils.batching import MicroBatcher
+        self.batcher = MicroBatcher(self._predict_batch, max_batch_size, max_wait_ms,
+                                    name=f"batcher-{Path(self.config.model_path).stem}")
+    
+    def _result_to_mask(self, result: Any, tile_shape: Tuple[int, ...]) -> np.ndarray:
+        """Rasterise the predictions of one tile into a label map."""
+        mask = np.zeros(tile_shape[:2], dtype=np.uint8)
+        if result.masks is None or len(result.boxes.cls) == 0:
+            return mask
         
-        # Save tile
-        cv2.imwrite(tile_path, tile)
+        labels = np.array([self.config.class_to_label(int(cls_idx)) for cls_idx in _to_numpy(result.boxes.cls)],
+                          dtype=np.uint8)
+        # Instances are painted in order, so later ones win where they overlap
+        order = None
+        if self.config.mask_overlap == "confidence":
+            order = np.argsort(_to_numpy(result.boxes.conf), kind="stable")
         
-        # Run model inference
-        results = self.model.predict(tile_path, conf=self.config.conf_threshold,verbose=False)
+        if self.config.mask_assembly == "raster":
+            # The model's own instance masks at its input resolution, thresholded before leaving the device
+            masks = _to_numpy(result.masks.data > 0.5)
+            if order is not None:
+                masks, labels = masks[order], labels[order]
+            return unletterbox(composite_instance_masks(masks, labels), tile_shape[:2])
         
         # Add predictions to the mask
-        if results[0].masks is not None:
-            for seg_polygon, cls_idx in zip(results[0].masks.xy, results[0].boxes.cls):
-                # Convert polygon coordinates to integer
-                polygon = seg_polygon.astype(np.int32)
-                
-                # Fill polygon with class color
-                color = self.config.color_map.get(int(cls_idx), (255, 255, 255))
-                cv2.fillPoly(mask, [polygon], color)
+        polygons = result.masks.xy
+        for i in (range(len(labels)) if order is None else order):
+            # Convert polygon coordinates to integer
+            polygon = polygons[i].astype(np.int32)
+            
+            # Fill polygon with class label
+            cv2.fillPoly(mask, [polygon], int(labels[i]))
         
         return mask
     
-    def generate_prediction_mask(self, image: np.ndarray, base_name: str) -> np.ndarray:
-        """Generate prediction mask by dividing image into tiles and processing each."""
+    def process_tiles(self, tiles: List[np.ndarray]) -> List[np.ndarray]:
+        """Run a batch of in-memory tiles through the model and return a label map per tile."""
+        if not tiles:
+            return []
+        if self.batcher is not None:
+            return self.batcher.predict(tiles)
+        return self._predict_batch(tiles)
+    
+    def _predict_batch(self, tiles: List[np.ndarray]) -> List[np.ndarray]:
+        """Run one forward pass over a batch of tiles."""
+        # Run model inference
+        with self._predict_lock:
+            results = self.model.predict(tiles, conf=self.config.conf_threshold, verbose=False)
+        
+        return [self._result_to_mask(result, tile.shape) for result, tile in zip(results, tiles)]
+    
+    def process_tile(self, tile: np.ndarray) -> np.ndarray:
+        """Process a single tile and return mask with predictions."""
+        return self.process_tiles([tile])[0]
+    
+    def predict_into(self, tiles: Sequence[Tile], load_tile: Callable[[Tile], np.ndarray],
+                     out: np.ndarray, y0: int = 0, x0: int = 0):
+        """
+        Run ``tiles`` through the model in batches and write each tile's core into ``out``.
+
+        ``out`` covers the image region starting at (``y0``, ``x0``); cores are
+        clipped to it, so it can be a window of a larger image. Tiles rejected
+        by the pre-filter are not run and leave ``out`` untouched.
+        """
+        batch_size = max(1, self.config.batch_size)
+        out_h, out_w = out.shape[:2]
+        kept = self._filtered_tiles(tiles, load_tile, batch_size)
+        
+        while True:
+            loaded = list(itertools.islice(kept, batch_size))
+            if not loaded:
+                break
+            batch, pixels = zip(*loaded)
+            metrics.inc("inference_tiles_total", len(batch))
+            
+            # Process tiles and copy the region each tile owns to the output
+            for tile, tile_mask in zip(batch, self.process_tiles(list(pixels))):
+                y1, y2 = max(tile.core_y1, y0), min(tile.core_y2, y0 + out_h)
+                x1, x2 = max(tile.core_x1, x0), min(tile.core_x2, x0 + out_w)
+                if y1 >= y2 or x1 >= x2:
+                    continue
+                out[y1 - y0:y2 - y0, x1 - x0:x2 - x0] = tile_mask[
+                    y1 - tile.y:y2 - tile.y,
+                    x1 - tile.x:x2 - tile.x,
+                ]
+    
+    def _filtered_tiles(self, tiles: Sequence[Tile], load_tile: Callable[[Tile], np.ndarray],
+                        chunk_size: int) -> Iterator[Tuple[Tile, np.ndarray]]:
+        """Load tiles and yield those passing the pre-filter, scoring ``chunk_size`` tiles at a time."""
+        for start in range(0, len(tiles), chunk_size):
+            chunk = tiles[start:start + chunk_size]
+            pixels = [load_tile(tile) for tile in chunk]
+            if self.tile_filter is None:
+                yield from zip(chunk, pixels)
+                continue
+            
+            keep = self.tile_filter(np.stack(pixels)) >= self.tile_filter_threshold
+            skipped = len(chunk) - int(keep.sum())
+            if skipped:
+                metrics.inc("inference_tiles_skipped_total", skipped, reason="low_information")
+            yield from ((tile, tile_pixels) for tile, tile_pixels, k in zip(chunk, pixels, keep) if k)
+    
+    def generate_prediction_mask(self, image: np.ndarray, base_name: str,
+                                 footprint: Optional[np.ndarray] = None,
+                                 schedule: Optional[Sequence[Tile]] = None) -> np.ndarray:
+        """
+        Generate a label map by dividing image into tiles and processing them in batches.
+
+        With a ``footprint`` (non-zero where buildings are, same size as the
+        image), tiles without any footprint pixel are not run and stay background.
+        A precomputed ``schedule`` (e.g. shared by both images of a pair) is used as is.
+        """
         height, width = image.shape[:2]
-        pred_mask = np.zeros((height, width, 3), dtype=np.uint8)
+        pred_mask = np.zeros((height, width), dtype=np.uint8)
         tile_size = self.config.tile_size
         
-        num_tiles_h = height // tile_size
-        num_tiles_w = width // tile_size
-        
-        for row in range(num_tiles_h):
-            for col in range(num_tiles_w):
-                y1, y2 = row * tile_size, (row + 1) * tile_size
-                x1, x2 = col * tile_size, (col + 1) * tile_size
-                
-                # Extract tile
-                tile = image[y1:y2, x1:x2]
-                tile_path = os.path.join(self.config.temp_dir, f"{base_name}_tile_{row}_{col}.png")
-                
-                # Process tile and get mask
-                tile_mask = self.process_tile(tile, tile_path, x1, y1)
-                
-                # Copy tile predictions to the main mask
-                pred_mask[y1:y2, x1:x2] = tile_mask
+        if schedule is None:
+            schedule = compute_tile_schedule(height, width, tile_size,
+                                             self.config.tile_overlap, self.config.tiling)
+        if footprint is not None:
+            full = len(schedule)
+            schedule = tiles_with_footprint(schedule, footprint)
+            if len(schedule) < full:
+                metrics.inc("inference_tiles_skipped_total", full - len(schedule), reason="no_buildings")
         
+        # Inner tiles are views into the image, no copies or temp files
+        self.predict_into(schedule, lambda tile: extract_tile(image, tile, tile_size), pred_mask)
         return pred_mask
 
 
@@ -247,22 +615,27 @@ class Postprocessor:
         """Initialize with configuration."""
         self.config = config
     
-    def color_to_class_id(self, color: Tuple[int, int, int]) -> int:
-        """Convert a color in the mask to a class ID."""
-        return self.config.color_map_inverse.get(tuple(color), 0)
+    def postprocess(self, pred_mask: np.ndarray, mode: Optional[str] = None) -> np.ndarray:
+        """Clean up a raw label map with the given (or configured) post-processing mode."""
+        mode = mode or self.config.postprocessing
+        if mode == "morphology":
+            return self.apply_morphological_operations(pred_mask)
+        if mode == "majority_vote":
+            return self.majority_voting_building_damage_mask(pred_mask, 3, 3)
+        raise ValueError(f"Unknown post-processing mode '{mode}', expected one of {POSTPROCESSING_MODES}")
     
     def apply_morphological_operations(self, pred_mask: np.ndarray, visualize: bool = False, 
                                       output_dir: Optional[str] = None) -> np.ndarray:
-        """Apply morphological operations to improve mask quality."""
+        """Apply morphological operations to improve the quality of a label map."""
         # Create a copy of the mask to avoid modifying the original
         processed_mask = np.zeros_like(pred_mask)
         
         # Create a "class priority" map to handle overlaps
         priority_map = np.zeros(pred_mask.shape[:2], dtype=np.uint8)
         
-        # Get unique colors from the mask (excluding background which is 0)
-        unique_colors = np.unique(pred_mask.reshape(-1, pred_mask.shape[2]), axis=0)
-        unique_colors = [tuple(color) for color in unique_colors if np.any(color != 0)]
+        # Get labels present in the mask (excluding background which is 0)
+        label_counts = np.bincount(pred_mask.ravel(), minlength=1)
+        unique_labels = [int(lbl) for lbl in np.flatnonzero(label_counts) if lbl != 0]
         
         # Optional: Define class priorities
         class_priorities = {
@@ -272,27 +645,27 @@ class Postprocessor:
             3: 4   # Highest priority
         }
         
-        # Create a list of (color, priority) tuples and sort by priority
-        color_priorities = []
-        for color in unique_colors:
-            # Get class ID for this color
-            class_id = self.color_to_class_id(color)  
+        # Create a list of (label, priority) tuples and sort by priority
+        label_priorities = []
+        for lbl in unique_labels:
+            # Labels are class IDs shifted by one to keep 0 for background
+            class_id = lbl - 1
             priority = class_priorities.get(class_id, 1)
-            color_priorities.append((color, priority))
+            label_priorities.append((lbl, priority))
         
         # Sort by priority (low to high)
-        color_priorities.sort(key=lambda x: x[1])
+        label_priorities.sort(key=lambda x: x[1])
         
         # Prepare visualization directory
         if visualize and output_dir and not os.path.exists(output_dir):
             os.makedirs(output_dir)
         
         # Process each class separately, from lowest to highest priority
-        for i, (color, priority) in enumerate(color_priorities):
-            class_id = self.color_to_class_id(color)
+        for i, (lbl, priority) in enumerate(label_priorities):
+            class_id = lbl - 1
             
             # Extract binary mask for this class
-            binary_mask = np.all(pred_mask == color, axis=2).astype(np.uint8) * 255
+            binary_mask = (pred_mask == lbl).astype(np.uint8) * 255
             
             # For visualization
             if visualize:
@@ -331,15 +704,13 @@ class Postprocessor:
                 stages["5_filtered"] = filtered.copy()
             
             # 5. Update the result only where this class has higher priority than existing content
-            class_result = np.zeros_like(pred_mask)
-            for y in range(filtered.shape[0]):
-                for x in range(filtered.shape[1]):
-                    if filtered[y, x] > 0 and priority > priority_map[y, x]:
-                        processed_mask[y, x] = color
-                        priority_map[y, x] = priority
-                        class_result[y, x] = color
+            update = (filtered > 0) & (priority > priority_map)
+            processed_mask[update] = lbl
+            priority_map[update] = priority
             
             if visualize:
+                class_result = np.zeros_like(pred_mask)
+                class_result[update] = lbl
                 self._visualize_processing_steps(stages, class_id, priority, class_result, output_dir)
         
         # Visualize final combined result if needed
@@ -351,6 +722,16 @@ class Postprocessor:
     def _visualize_processing_steps(self, stages: Dict[str, np.ndarray], class_id: int, 
                                    priority: int, class_result: np.ndarray, output_dir: Optional[str] = None):
         """Visualize the processing steps for a class."""
+        if self.config.vis_backend == "opencv" and output_dir:
+            masks = [stages[key] for key in ("1_original", "2_opened", "3_closed", "4_separated", "5_filtered")]
+            titles = ["Original Binary Mask", "After Opening (Noise Removal)", "After Closing (Fill Holes)",
+                      "After Erosion (Separation)", "After Small Object Removal", "Added to Final Result"]
+            panels = [cv2.cvtColor(mask, cv2.COLOR_GRAY2BGR) for mask in masks] + [self.config.colorize(class_result)]
+            grid = compose_panels(panels, titles, columns=3, heading=f"Class {class_id} (Priority {priority})")
+            cv2.imwrite(os.path.join(output_dir, f'class_{class_id}_process.png'), grid)
+            return
+        
+        import matplotlib.pyplot as plt  # only needed for visualisations
         fig, axs = plt.subplots(2, 3, figsize=(18, 10))
         fig.suptitle(f'Class {class_id} (Priority {priority})', fontsize=16)
         
@@ -371,7 +752,7 @@ class Postprocessor:
         axs[1, 1].set_title('After Small Object Removal')
         
         # Display this class's contribution to final result
-        axs[1, 2].imshow(class_result)
+        axs[1, 2].imshow(self.config.colorize(class_result))
         axs[1, 2].set_title('Added to Final Result')
         
         # Adjust layout
@@ -387,8 +768,18 @@ class Postprocessor:
     def _visualize_final_result(self, original_mask: np.ndarray, processed_mask: np.ndarray, 
                                output_dir: Optional[str] = None):
         """Visualize the final processed mask compared to the original."""
+        if self.config.vis_backend == "opencv" and output_dir:
+            processed = self.config.colorize(processed_mask)
+            cv2.imwrite(os.path.join(output_dir, 'final_processed_mask.png'),
+                        compose_panels([processed], ['Final Processed Mask (All Classes)']))
+            cv2.imwrite(os.path.join(output_dir, 'before_after_comparison.png'),
+                        compose_panels([self.config.colorize(original_mask), processed],
+                                       ['Original Mask', 'Processed Mask']))
+            return
+        
+        import matplotlib.pyplot as plt
         plt.figure(figsize=(10, 10))
-        plt.imshow(processed_mask)
+        plt.imshow(self.config.colorize(processed_mask))
         plt.title('Final Processed Mask (All Classes)')
         
         if output_dir:
@@ -400,11 +791,11 @@ class Postprocessor:
         # Visualize original vs processed for comparison
         plt.figure(figsize=(18, 8))
         plt.subplot(1, 2, 1)
-        plt.imshow(original_mask)
+        plt.imshow(self.config.colorize(original_mask))
         plt.title('Original Mask')
         
         plt.subplot(1, 2, 2)
-        plt.imshow(processed_mask)
+        plt.imshow(self.config.colorize(processed_mask))
         plt.title('Processed Mask')
         
         if output_dir:
@@ -415,56 +806,34 @@ class Postprocessor:
     
     def majority_voting_building_damage_mask(
         self,
-        rgb_mask: np.ndarray,
+        label_map: np.ndarray,
         kernel_size: int = 3,
         dilate_iter: int = 1,
-        return_rgb: bool = True
+        return_rgb: bool = False
     ) -> np.ndarray:
         """
-        Post‑process a mask so each building has exactly one damage class (majority vote).
+        Post‑process a label map so each building has exactly one damage class (majority vote).
         """
-        # ---------- helpers -----------------------------------------------------
-        def _rgb_to_label(img):
-            colours = np.unique(img.reshape(-1, 3), axis=0)
-            colour2id = {tuple(c): i + 1          # start at 1, reserve 0 for bg
-                        for i, c in enumerate(colours) if not np.all(c == 0)}
-            label_map = np.zeros(img.shape[:2], dtype=np.int32)
-            for col, idx in colour2id.items():
-                label_map[np.all(img == col, axis=-1)] = idx
-            return label_map, colour2id
-
-        def _label_to_rgb(lbl, colour2id):
-            id2colour = {v: k for k, v in colour2id.items()}
-            out = np.zeros((*lbl.shape, 3), dtype=np.uint8)
-            for idx, col in id2colour.items():
-                out[lbl == idx] = col
-            return out
-        # -----------------------------------------------------------------------
-
-        # 1)  RGB → integer label map
-        label_map, colour_map = _rgb_to_label(rgb_mask)
-
-        # 2)  Dilate the binary building mask to merge touching fragments
+        # 1)  Dilate the binary building mask to merge touching fragments
         kernel = np.ones((kernel_size, kernel_size), np.uint8)
         building_bin = (label_map > 0).astype(np.uint8)
         building_dil = cv2.dilate(building_bin, kernel, iterations=dilate_iter)
 
-        # 3)  Connected components on the dilated mask
-        blobs, n_blobs = label(building_dil, structure=np.ones((3, 3)))
+        # 2)  Connected components on the dilated mask
+        n_blobs, blobs = cv2.connectedComponents(building_dil, connectivity=8)
 
-        # 4)  Majority vote inside each component
-        refined = label_map.copy()
-        for b in range(1, n_blobs + 1):
-            mask = blobs == b
-            if not np.any(mask):
-                continue
-            vals, counts = np.unique(refined[mask], return_counts=True)
-            majority_cls = vals[counts.argmax()]
-            refined[mask] = majority_cls
+        # 3)  Majority vote inside each component: one (blob, class) histogram
+        #     over all pixels, then a lookup of each blob's most frequent class
+        #     (ties go to the lowest label, as np.unique + argmax did)
+        n_labels = int(label_map.max()) + 1
+        pair_ids = blobs.ravel().astype(np.int64) * n_labels + label_map.ravel()
+        histogram = np.bincount(pair_ids, minlength=n_blobs * n_labels).reshape(n_blobs, n_labels)
+        majority = histogram.argmax(axis=1).astype(label_map.dtype)
+        refined = np.where(blobs > 0, majority[blobs], label_map)
 
-        # 5)  Return in the requested format
+        # 4)  Return in the requested format
         if return_rgb:
-            return _label_to_rgb(refined, colour_map)
+            return self.config.colorize(refined)
         return refined
 
 
@@ -472,16 +841,91 @@ class Postprocessor:
 # Visualization
 # ------------------------------------------------------------------------
 
+def _titled(panel: np.ndarray, title: str, width: int, height: int) -> np.ndarray:
+    """Place ``panel`` on a black (height x width) canvas under a header bar with ``title``."""
+    scale = max(0.5, width / 640)
+    header = int(32 * scale)
+    canvas = np.zeros((header + height, width, 3), dtype=np.uint8)
+    canvas[header:header + panel.shape[0], :panel.shape[1]] = panel
+    (text_w, text_h), _ = cv2.getTextSize(title, cv2.FONT_HERSHEY_SIMPLEX, scale * 0.7, max(1, int(scale)))
+    origin = (max(0, (width - text_w) // 2), (header + text_h) // 2)
+    cv2.putText(canvas, title, origin, cv2.FONT_HERSHEY_SIMPLEX, scale * 0.7, (255, 255, 255),
+                max(1, int(scale)), cv2.LINE_AA)
+    return canvas
+
+
+def compose_panels(panels: Sequence[np.ndarray], titles: Sequence[str], columns: Optional[int] = None,
+                   heading: Optional[str] = None, gap: int = 8) -> np.ndarray:
+    """
+    Lay BGR (or grayscale) panels out in a titled grid, at the panels' own resolution.
+
+    This is the OpenCV replacement for the matplotlib figures: a few array
+    copies and ``cv2.putText`` instead of rendering and rasterising a figure.
+    """
+    panels = [cv2.cvtColor(p, cv2.COLOR_GRAY2BGR) if p.ndim == 2 else p for p in panels]
+    columns = columns or len(panels)
+    width = max(p.shape[1] for p in panels)
+    height = max(p.shape[0] for p in panels)
+    cells = [_titled(p, t, width, height) for p, t in zip(panels, titles)]
+    cells += [np.zeros_like(cells[0])] * (-len(cells) % columns)  # fill the last row
+
+    spacer = np.zeros((cells[0].shape[0], gap, 3), dtype=np.uint8)
+    rows = []
+    for r in range(0, len(cells), columns):
+        row = [cells[r]]
+        for cell in cells[r + 1:r + columns]:
+            row += [spacer, cell]
+        rows.append(np.hstack(row))
+    grid = np.vstack([rows[0]] + [np.vstack([np.zeros((gap, rows[0].shape[1], 3), np.uint8), row])
+                                  for row in rows[1:]])
+    if heading:
+        grid = _titled(grid, heading, grid.shape[1], grid.shape[0])
+    return grid
+
+
 class Visualizer:
     """Class to handle visualization of results."""
     
     def __init__(self, config: Config):
         """Initialize with configuration."""
         self.config = config
+        if config.vis_backend not in VIS_BACKENDS:
+            raise ValueError(f"Unknown visualisation backend '{config.vis_backend}', expected one of {VIS_BACKENDS}")
+    
+    def overlay(self, original: np.ndarray, label_map: np.ndarray, alpha: Optional[float] = None) -> np.ndarray:
+        """Blend the colourised label map over the image on building pixels only."""
+        alpha = self.config.vis_alpha if alpha is None else alpha
+        blended = original.copy()
+        buildings = label_map > 0
+        if not buildings.any():
+            return blended
+        blended[buildings] = cv2.addWeighted(original[buildings], 1 - alpha,
+                                             self.config.colorize(label_map[buildings]), alpha, 0)
+        return blended
     
     def save_visualization(self, original: np.ndarray, pred_mask: np.ndarray, base_name: str, 
                           gt_mask: Optional[np.ndarray] = None):
         """Save visualization of original image, prediction, and optionally ground truth."""
+        save_path = os.path.join(self.config.vis_dir, f"visualization_{base_name}.png")
+        if self.config.vis_backend == "matplotlib":
+            self._save_matplotlib(original, pred_mask, save_path, gt_mask)
+            return
+        
+        panels, titles = [original], ["Original Image"]
+        if self.config.ground_truth and gt_mask is not None:
+            panels.append(self.config.colorize(gt_mask))
+            titles.append("Ground Truth Mask")
+        panels.append(self.config.colorize(pred_mask))
+        titles.append("Prediction Mask")
+        if self.config.vis_alpha > 0:
+            panels.append(self.overlay(original, pred_mask))
+            titles.append("Prediction Overlay")
+        cv2.imwrite(save_path, compose_panels(panels, titles))
+    
+    def _save_matplotlib(self, original: np.ndarray, pred_mask: np.ndarray, save_path: str,
+                         gt_mask: Optional[np.ndarray] = None):
+        """The original 300-dpi matplotlib figure (``vis_backend: matplotlib``)."""
+        import matplotlib.pyplot as plt  # only needed for visualisations
         # Determine the layout based on whether we have ground truth
         if self.config.ground_truth and gt_mask is not None:
             plt.figure(figsize=(18, 6))
@@ -495,13 +939,13 @@ class Visualizer:
             # Ground truth mask
             plt.subplot(1, 3, 2)
             plt.title("Ground Truth Mask")
-            plt.imshow(cv2.cvtColor(gt_mask, cv2.COLOR_BGR2RGB))
+            plt.imshow(cv2.cvtColor(self.config.colorize(gt_mask), cv2.COLOR_BGR2RGB))
             plt.axis("off")
             
             # Prediction mask
             plt.subplot(1, 3, 3)
             plt.title("Prediction Mask")
-            plt.imshow(cv2.cvtColor(pred_mask, cv2.COLOR_BGR2RGB))
+            plt.imshow(cv2.cvtColor(self.config.colorize(pred_mask), cv2.COLOR_BGR2RGB))
             plt.axis("off")
         else:
             plt.figure(figsize=(12, 6))
@@ -515,11 +959,10 @@ class Visualizer:
             # Prediction mask
             plt.subplot(1, 2, 2)
             plt.title("Prediction Mask")
-            plt.imshow(cv2.cvtColor(pred_mask, cv2.COLOR_BGR2RGB))
+            plt.imshow(cv2.cvtColor(self.config.colorize(pred_mask), cv2.COLOR_BGR2RGB))
             plt.axis("off")
         
         plt.tight_layout()
-        save_path = os.path.join(self.config.vis_dir, f"visualization_{base_name}.png")
         plt.savefig(save_path, bbox_inches='tight', dpi=300)
         plt.close()
 
@@ -548,93 +991,185 @@ class DamageSegmentationPipeline:
         self.model = YoloInference(self.config)
         self.postprocessor = Postprocessor(self.config)
         self.visualizer = Visualizer(self.config)
+        self._plot_lock = threading.Lock()
     
     def run(self):
         """Run the complete pipeline."""
         # Get all image files
         image_files = self.data_handler.list_image_files()
         
-        total_start_time = time.time()
-        print(f"Starting processing of {len(image_files)} images")
+        # Indices come from the full listing so save_interval picks the same images on a resumed run
+        items = list(enumerate(image_files))
+        if self.config.skip_existing:
+            items = [(idx, f) for idx, f in items if not self.data_handler.has_outputs(Path(f).stem)]
+            if len(items) < len(image_files):
+                print(f"Skipping {len(image_files) - len(items)} images with existing outputs in {self.config.output_dir}")
         
-        for idx, image_file in enumerate(image_files):
-            try:
-                base_name = Path(image_file).stem
-                print(f"\nProcessing image {idx+1}/{len(image_files)}: {base_name}")
-                
-                # Process individual image
-                self.process_single_image(image_file, idx)
-                
-            except Exception as e:
-                print(f"Error processing {image_file}: {str(e)}")
+        total_start_time = time.time()
+        print(f"Starting processing of {len(items)} images")
         
-        # Cleanup temp files
-        self.data_handler.cleanup()
+        if self.config.workers > 0:
+            self._run_parallel(items)
+        else:
+            for position, (idx, image_file) in enumerate(items):
+                try:
+                    base_name = Path(image_file).stem
+                    print(f"\nProcessing image {position+1}/{len(items)}: {base_name}")
+                    
+                    # Process individual image
+                    self.process_single_image(image_file, idx)
+                    
+                except Exception as e:
+                    print(f"Error processing {image_file}: {str(e)}")
         
         total_time = time.time() - total_start_time
         print(f"\nTotal processing time: {total_time:.2f} seconds")
-        print(f"Average time per image: {total_time/len(image_files):.2f} seconds")
-    
-    def process_single_image(self, image_file: str, idx: int):
-        """Process a single image through the pipeline."""
-        base_name = Path(image_file).stem
-        
-        # Overall timing for this image
-        image_start_time = time.time()
-        
-        # Load image
-        load_start = time.time()
-        image = self.data_handler.load_image(image_file)
-        load_time = time.time() - load_start
-        print(f"  Load image: {load_time:.2f} seconds")
+        if items:
+            print(f"Average time per image: {total_time/len(items):.2f} seconds")
         
+        # Latency distribution of each stage over the run
+        for stage, summary in metrics.stage_summary().items():
+            print(f"  {stage:<13} p50 {summary['p50']:.2f}s  p95 {summary['p95']:.2f}s  p99 {summary['p99']:.2f}s")
+    
+    # ------------------------------------------------------------------
+    # Stages (shared by the sequential and parallel modes)
+    # ------------------------------------------------------------------
+    def _load(self, image_file: str, timings: Dict[str, float]) -> Tuple[Optional[np.ndarray], Optional[np.ndarray]]:
+        """Read an image and, if enabled, its ground truth mask."""
+        with metrics.timed("load", timings):
+            image = self.data_handler.load_image(image_file)
         if image is None:
-            print("  Failed to load image")
-            return
-        
-        height, width = image.shape[:2]
+            metrics.inc("inference_errors_total", stage="load")
+            return None, None
         
-        # Create ground truth mask if needed
         gt_mask = None
         if self.config.ground_truth:
-            gt_start = time.time()
-            gt_mask = self.data_handler.create_ground_truth_mask(base_name, height, width)
-            gt_time = time.time() - gt_start
-            print(f"  Create ground truth: {gt_time:.2f} seconds")
-        
-        # Generate prediction mask from tiles
-        inference_start = time.time()
-        raw_pred_mask = self.model.generate_prediction_mask(image, base_name)
-        inference_time = time.time() - inference_start
-        print(f"  Model inference: {inference_time:.2f} seconds")
-        
-        # Apply post-processing
-        postproc_start = time.time()
-        pred_mask = self.postprocessor.apply_morphological_operations(raw_pred_mask)
-        postproc_time = time.time() - postproc_start
-        print(f"  Post-processing: {postproc_time:.2f} seconds")
-        
-        # Alternative post-processing method
-        # pred_mask = self.postprocessor.majority_voting_building_damage_mask(raw_pred_mask, 3, 3)
-        
-        # Save visualizations and masks
+            height, width = image.shape[:2]
+            with metrics.timed("ground_truth", timings):
+                gt_mask = self.data_handler.create_ground_truth_mask(Path(image_file).stem, height, width)
+        return image, gt_mask
+    
+    def _infer(self, image: np.ndarray, base_name: str, timings: Dict[str, float]) -> np.ndarray:
+        """Generate the raw prediction mask from tiles."""
+        with metrics.timed("model", timings):
+            raw_pred_mask = self.model.generate_prediction_mask(image, base_name)
+        metrics.inc("inference_images_total", mask_type="pipeline")
+        return raw_pred_mask
+    
+    def _finish(self, idx: int, image: np.ndarray, raw_pred_mask: np.ndarray, base_name: str,
+                gt_mask: Optional[np.ndarray], timings: Dict[str, float]) -> Dict[str, float]:
+        """Post-process, visualise and save one image; returns its stage timings."""
+        # Apply post-processing (config.postprocessing selects the method)
+        with metrics.timed("postprocess", timings):
+            pred_mask = self.postprocessor.postprocess(raw_pred_mask)
+        
+        # Save masks first, so a failed visualisation can't drop outputs
         should_save = not self.config.skip_save or idx % self.config.save_interval == 0
         
+        if should_save:
+            with metrics.timed("save", timings):
+                self.data_handler.save_masks(pred_mask, base_name, gt_mask)
+        
         if idx % self.config.save_interval == 0:
-            vis_start = time.time()
-            self.visualizer.save_visualization(image, pred_mask, base_name, gt_mask)
-            vis_time = time.time() - vis_start
-            print(f"  Visualization: {vis_time:.2f} seconds")
+            # pyplot keeps global state, so matplotlib figures are drawn one at a time
+            plot_lock = self._plot_lock if self.config.vis_backend == "matplotlib" else nullcontext()
+            with plot_lock, metrics.timed("visualize", timings):
+                self.visualizer.save_visualization(image, pred_mask, base_name, gt_mask)
+        return timings
+    
+    def process_single_image(self, image_file: str, idx: int):
+        """Process a single image through the pipeline."""
+        base_name = Path(image_file).stem
         
-        if should_save:
-            save_start = time.time()
-            self.data_handler.save_masks(pred_mask, base_name, gt_mask)
-            save_time = time.time() - save_start
-            print(f"  Save masks: {save_time:.2f} seconds")
+        # Per-stage timings, also recorded in the process-wide metrics
+        timings: Dict[str, float] = {}
+        
+        with metrics.timed("image", timings):
+            image, gt_mask = self._load(image_file, timings)
+            print(f"  Load image: {timings['load']:.2f} seconds")
+            if image is None:
+                print("  Failed to load image")
+                return
+            if "ground_truth" in timings:
+                print(f"  Create ground truth: {timings['ground_truth']:.2f} seconds")
+            
+            raw_pred_mask = self._infer(image, base_name, timings)
+            print(f"  Model inference: {timings['model']:.2f} seconds")
+            
+            self._finish(idx, image, raw_pred_mask, base_name, gt_mask, timings)
+            print(f"  Post-processing: {timings['postprocess']:.2f} seconds")
+            if "visualize" in timings:
+                print(f"  Visualization: {timings['visualize']:.2f} seconds")
+            if "save" in timings:
+                print(f"  Save masks: {timings['save']:.2f} seconds")
         
         # Total time for this image
-        image_time = time.time() - image_start_time
-        print(f"  Total time for image: {image_time:.2f} seconds")
+        print(f"  Total time for image: {timings['image']:.2f} seconds")
+    
+    # ------------------------------------------------------------------
+    # Parallel batch mode
+    # ------------------------------------------------------------------
+    def _run_parallel(self, items: List[Tuple[int, str]]):
+        """
+        Process images as a staged pipeline: loading runs ahead on a thread
+        pool, the model runs on this thread, and post-processing,
+        visualisation and saving run on a second pool. Progress is reported
+        in input order.
+        """
+        workers = max(1, self.config.workers)
+        prefetch = max(1, self.config.prefetch)
+        total = len(items)
+        loads: deque = deque()
+        finishing: deque = deque()
+        next_load = 0
+        reported = 0
+        
+        def _fill_loads(loader: ThreadPoolExecutor):
+            nonlocal next_load
+            while next_load < total and len(loads) < prefetch:
+                timings: Dict[str, float] = {}
+                loads.append((timings, loader.submit(self._load, items[next_load][1], timings)))
+                next_load += 1
+        
+        def _report(image_file: str, outcome: Any):
+            nonlocal reported
+            reported += 1
+            try:
+                timings = outcome.result() if isinstance(outcome, Future) else outcome
+                if isinstance(timings, Exception):
+                    raise timings
+            except Exception as e:
+                print(f"[{reported}/{total}] Error processing {image_file}: {str(e)}")
+                return
+            stages = ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in timings.items())
+            print(f"[{reported}/{total}] {Path(image_file).stem}: {stages}")
+        
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="load") as loader, \
+                ThreadPoolExecutor(max_workers=workers, thread_name_prefix="postprocess") as finisher:
+            _fill_loads(loader)
+            for idx, image_file in items:
+                base_name = Path(image_file).stem
+                timings, loading = loads.popleft()
+                _fill_loads(loader)
+                
+                try:
+                    image, gt_mask = loading.result()
+                    if image is None:
+                        raise ValueError("failed to load image")
+                    raw_pred_mask = self._infer(image, base_name, timings)
+                except Exception as e:
+                    finishing.append((image_file, e))
+                else:
+                    finishing.append((image_file, finisher.submit(
+                        self._finish, idx, image, raw_pred_mask, base_name, gt_mask, timings)))
+                
+                # Report finished images in order; wait on the oldest once too many are in flight
+                while finishing and (not isinstance(finishing[0][1], Future) or finishing[0][1].done()
+                                     or len(finishing) > 2 * workers):
+                    _report(*finishing.popleft())
+            
+            while finishing:
+                _report(*finishing.popleft())
 
 
 # ------------------------------------------------------------------------
@@ -648,6 +1183,9 @@ def main():
     parser = argparse.ArgumentParser(description='Run building damage segmentation pipeline')
     parser.add_argument('--config', type=str, help='Path to configuration YAML file')
     parser.add_argument('--ground-truth', action='store_true', help='Enable ground truth processing')
+    parser.add_argument('--workers', type=int, default=None, help='Load/post-process threads (parallel batch mode)')
+    parser.add_argument('--prefetch', type=int, default=None, help='Images loaded ahead of the model')
+    parser.add_argument('--resume', action='store_true', help='Skip images whose outputs already exist')
     args = parser.parse_args()
     
     # Create and run the segmentation pipeline
@@ -656,6 +1194,12 @@ def main():
     # Override ground truth setting if specified via command line
     if args.ground_truth:
         pipeline.config.ground_truth = True
+    if args.workers is not None:
+        pipeline.config.workers = args.workers
+    if args.prefetch is not None:
+        pipeline.config.prefetch = args.prefetch
+    if args.resume:
+        pipeline.config.skip_existing = True
         
     pipeline.run()
 
@@ -0,0 +1,162 @@
+import os
+import json
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+from utils.settings import RESULT_CACHE_SIZE, RESULT_CACHE_DIR, RESULT_CACHE_DISK_MAX_MB
+
+
+def make_cache_key(source_id: str, **params: Any) -> str:
+    """
+    Build a cache key from the image identity and everything that affects the result.
+
+    ``source_id`` is a content hash or URL+ETag; ``params`` carry the model
+    fingerprint, thresholds and post-processing mode.
+    """
+    payload = json.dumps({"source": source_id, **params}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    Two-tier cache of /predict results (uploaded mask URL and cluster stats).
+
+    The in-process tier is an LRU bounded by entry count. The optional disk
+    tier stores one JSON file per key and evicts the least recently used
+    files once it grows past ``disk_max_bytes``.
+    """
+
+    def __init__(self, max_entries: int = RESULT_CACHE_SIZE,
+                 disk_dir: Optional[str] = RESULT_CACHE_DIR or None,
+                 disk_max_bytes: int = RESULT_CACHE_DISK_MAX_MB * 1024 * 1024):
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self._memory: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0,
+                          "memory_evictions": 0, "disk_evictions": 0}
+
+        self._disk_bytes = 0
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            self._disk_bytes = sum(size for _, size, _ in self._disk_files())
+
+    # ------------------------------------------------------------------
+    # Disk tier
+    # ------------------------------------------------------------------
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.json")
+
+    def _disk_files(self):
+        """Yield (path, size, last access) for every cached file."""
+        with os.scandir(self.disk_dir) as entries:
+            for entry in entries:
+                if entry.name.endswith(".json"):
+                    st = entry.stat()
+                    yield entry.path, st.st_size, st.st_mtime
+
+    def _disk_get(self, key: str) -> Optional[Dict[str, Any]]:
+        path = self._disk_path(key)
+        try:
+            with open(path, "r") as f:
+                value = json.load(f)
+        except (OSError, ValueError):
+            return None
+        os.utime(path)  # mtime doubles as last-access time for eviction
+        return value
+
+    def _disk_put(self, key: str, value: Dict[str, Any]):
+        path = self._disk_path(key)
+        data = json.dumps(value).encode("utf-8")
+
+        # Write-then-rename so readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=self.disk_dir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        previous = os.path.getsize(path) if os.path.exists(path) else 0
+        os.replace(tmp_path, path)
+        self._disk_bytes += len(data) - previous
+
+        if self._disk_bytes > self.disk_max_bytes:
+            self._disk_evict()
+
+    def _disk_evict(self):
+        """Delete least recently used files until the tier is back under its size limit."""
+        files = sorted(self._disk_files(), key=lambda item: item[2])
+        self._disk_bytes = sum(size for _, size, _ in files)
+        # Leave some headroom so the next few writes don't trigger another scan
+        target = int(self.disk_max_bytes * 0.9)
+        for path, size, _ in files:
+            if self._disk_bytes <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self._disk_bytes -= size
+            self._counters["disk_evictions"] += 1
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the cached result for ``key``, or None on a miss."""
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+                self._counters["memory_hits"] += 1
+                return value
+
+            if self.disk_dir:
+                value = self._disk_get(key)
+                if value is not None:
+                    self._memory_put(key, value)
+                    self._counters["disk_hits"] += 1
+                    return value
+
+            self._counters["misses"] += 1
+            return None
+
+    def _memory_put(self, key: str, value: Dict[str, Any]):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._counters["memory_evictions"] += 1
+
+    def put(self, key: str, value: Dict[str, Any]):
+        """Store a result in both tiers."""
+        with self._lock:
+            self._memory_put(key, value)
+            if self.disk_dir:
+                self._disk_put(key, value)
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current tier sizes."""
+        with self._lock:
+            lookups = self._counters["memory_hits"] + self._counters["disk_hits"] + self._counters["misses"]
+            hits = lookups - self._counters["misses"]
+            return {
+                **self._counters,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "disk_bytes": self._disk_bytes,
+            }
+
+    def clear(self):
+        """Drop every cached result."""
+        with self._lock:
+            self._memory.clear()
+            if self.disk_dir:
+                for path, _, _ in list(self._disk_files()):
+                    os.remove(path)
+                self._disk_bytes = 0
+
+
+# Shared by all requests handled by this worker process
+result_cache = ResultCache()
@@ -0,0 +1,449 @@
+import hashlib
+import threading
+import cv2
+import numpy as np
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, Future
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Any, NamedTuple, Optional, Sequence, Tuple
+
+from utils.model_registry import model_registry
+from utils.perform_inference import Tile, compute_tile_schedule
+from utils.others import (
+    download_image, download_image_bytes, decode_image, get_etag,
+    save_and_upload_mask, split_filename_and_extension, count_building_clusters,
+)
+from utils.metrics import metrics
+from utils.result_cache import result_cache, make_cache_key
+from utils.worker_pool import get_inference_pool
+from utils.settings import (
+    LOCALISATION_MODEL_PATH, DAMAGE_MODEL_PATH,
+    DOWNLOAD_WORKERS, UPLOAD_WORKERS, DOWNLOAD_PREFETCH,
+    RESULT_CACHE_ENABLED, RESULT_CACHE_USE_ETAG, CLUSTER_STATS_FORMAT,
+    PAIR_MODE, PAIR_FOOTPRINT_MARGIN, PAIR_STATS_IN_FOOTPRINT, PAIR_FOOTPRINT_CACHE_SIZE,
+)
+
+# I/O pools shared by all requests, so concurrency stays bounded per worker process
+_download_pool = ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS, thread_name_prefix="download")
+_upload_pool = ThreadPoolExecutor(max_workers=UPLOAD_WORKERS, thread_name_prefix="upload")
+
+
+@dataclass
+class ImageTask:
+    """One image of a /predict request and the model that should process it."""
+    pair_index: int
+    image_name: str
+    image_url: str
+    model_path: str
+    mask_type: str
+
+
+@dataclass
+class PairTask:
+    """The images of one request pair, the unit that is downloaded, inferred and uploaded together."""
+    pair_index: int
+    tasks: List[ImageTask]
+
+
+def plan_pair_tasks(image_pairs: List[Dict[str, str]]) -> List[PairTask]:
+    """Expand the request pairs into image tasks, in the order they are processed."""
+    pairs = []
+    for pair_index, pair in enumerate(image_pairs):
+        tasks = []
+        # The damage pass can use the pair's localisation, so pre-disaster images go first
+        for image_name, image_url in sorted(pair.items(), key=lambda item: "pre_disaster" not in item[0]):
+            # Decide model path
+            if "pre_disaster" in image_name:
+                model_path, mask_type = LOCALISATION_MODEL_PATH, "localisation"
+            elif "post_disaster" in image_name:
+                model_path, mask_type = DAMAGE_MODEL_PATH, "damage_severity_mask"
+            else:
+                continue  # Skip unrelated files
+            tasks.append(ImageTask(pair_index, image_name, image_url, model_path, mask_type))
+        pairs.append(PairTask(pair_index, tasks))
+    return pairs
+
+
+def mask_public_id(image_name: str, cache_key: Optional[str] = None) -> str:
+    """
+    Cloudinary public ID of the mask generated for ``image_name``.
+
+    With a result ``cache_key`` the ID is suffixed with it, so a later request
+    for the same name with other content or settings uploads a new asset
+    instead of overwriting the one a cached result still points to.
+    """
+    base, ext = split_filename_and_extension(image_name)
+    if cache_key is None:
+        return f"{base}_mask_{ext}"
+    return f"{base}_mask_{ext}_{cache_key[:16]}"
+
+
+@dataclass
+class FetchedImage:
+    """Output of the download stage: a decoded image or a cached result."""
+    image: Optional[np.ndarray] = None
+    cache_key: Optional[str] = None
+    cached: Optional[Dict[str, Any]] = None
+
+
+def _result_cache_key(task: ImageTask, source_id: str, postprocessing: str) -> str:
+    """Key a task's result by image identity, model identity and inference settings."""
+    return make_cache_key(
+        source_id,
+        **model_registry.identity(task.model_path),
+        postprocessing=postprocessing,
+        stats_format=CLUSTER_STATS_FORMAT,
+        image_name=task.image_name,
+    )
+
+
+def fetch_image(task: ImageTask, postprocessing: str, lookup: bool = True) -> FetchedImage:
+    """
+    Download stage: resolve cached results first, then download and decode the image.
+
+    With ``lookup`` off the image is always decoded and only its cache key is
+    returned, for results whose key depends on more than this image.
+    """
+    if not RESULT_CACHE_ENABLED:
+        return FetchedImage(image=download_image(task.image_url))
+
+    # URL + ETag lets a hit skip the download entirely
+    if RESULT_CACHE_USE_ETAG:
+        with metrics.timed("etag"):
+            etag = get_etag(task.image_url)
+        if etag:
+            key = _result_cache_key(task, f"{task.image_url}#{etag}", postprocessing)
+            cached = result_cache.get(key) if lookup else None
+            if cached is not None:
+                return FetchedImage(cache_key=key, cached=cached)
+            return FetchedImage(image=download_image(task.image_url), cache_key=key)
+
+    data = download_image_bytes(task.image_url)
+    if data is None:
+        return FetchedImage()
+
+    key = _result_cache_key(task, hashlib.sha256(data).hexdigest(), postprocessing)
+    cached = result_cache.get(key) if lookup else None
+    if cached is not None:
+        return FetchedImage(cache_key=key, cached=cached)
+    return FetchedImage(image=decode_image(data), cache_key=key)
+
+
+def infer_label_map(image: np.ndarray, model_path: str, postprocessing: str, with_stats: bool,
+                    base_name: str = "image", timings: Optional[Dict[str, float]] = None,
+                    footprint: Optional[np.ndarray] = None, stats_footprint: Optional[np.ndarray] = None,
+                    schedule: Optional[Sequence[Tile]] = None
+                    ) -> Tuple[np.ndarray, Optional[Dict[str, Any]]]:
+    """
+    Model, post-processing and (optionally) cluster stats for one image, timed per stage into ``timings``.
+
+    With a ``footprint`` only tiles containing localised buildings are run;
+    with a ``stats_footprint`` only clusters inside it are counted.
+    """
+    # Shared model, loaded once per worker
+    loaded = model_registry.get(model_path)
+    with metrics.timed("model", timings):
+        pred_mask = loaded.model.generate_prediction_mask(image, base_name, footprint, schedule)
+    with metrics.timed("postprocess", timings):
+        processed_mask = loaded.postprocessor.postprocess(pred_mask, postprocessing)
+    stats = None
+    if with_stats:
+        stats_mask = processed_mask if stats_footprint is None else processed_mask * (stats_footprint > 0)
+        with metrics.timed("clusters", timings):
+            stats = count_building_clusters(stats_mask, columnar=CLUSTER_STATS_FORMAT == "columns")
+    return processed_mask, stats
+
+
+# ------------------------------------------------------------------------
+# Pair pass
+# ------------------------------------------------------------------------
+
+class PairImage(NamedTuple):
+    """One image of a pair pass (the pixels travel separately, e.g. through shared memory)."""
+    model_path: str
+    mask_type: str
+    base_name: str
+    uses_footprint: bool  # damage image processed against the pair's localisation
+
+
+def _footprint_dependent() -> bool:
+    """Whether damage results depend on the pair's localisation."""
+    return PAIR_MODE == "fused" or PAIR_STATS_IN_FOOTPRINT
+
+
+def localisation_footprint(localisation_mask: np.ndarray) -> np.ndarray:
+    """Buildings found by the localisation model, grown by PAIR_FOOTPRINT_MARGIN pixels to absorb misregistration."""
+    footprint = (localisation_mask > 0).astype(np.uint8)
+    if PAIR_FOOTPRINT_MARGIN > 0:
+        size = 2 * PAIR_FOOTPRINT_MARGIN + 1
+        footprint = cv2.dilate(footprint, cv2.getStructuringElement(cv2.MORPH_RECT, (size, size)))
+    return footprint
+
+
+def infer_pair(images: List[np.ndarray], items: List[PairImage], postprocessing: str,
+               footprint: Optional[np.ndarray] = None, timings: Optional[List[Dict[str, float]]] = None
+               ) -> Tuple[List[Tuple[np.ndarray, Optional[Dict[str, Any]]]], Optional[np.ndarray]]:
+    """
+    Run the decoded images of one pair back to back, localisation first.
+
+    Images with the same size and tiling share one tile schedule, and the
+    localisation footprint stays in memory for the damage image: in fused
+    mode it limits the tiles that are run, with PAIR_STATS_IN_FOOTPRINT the
+    clusters that are counted. ``footprint`` seeds it when the localisation
+    result came from the cache. Returns (label map, stats) per image and the footprint.
+    Stage timings (including "inference", the whole image) are appended to ``timings``, one dict per image.
+    """
+    results = []
+    schedules: Dict[Tuple[int, ...], Tuple[Tile, ...]] = {}
+    for image, item in zip(images, items):
+        config = model_registry.get(item.model_path).config
+        grid = (image.shape[0], image.shape[1], config.tile_size, config.tile_overlap, config.tiling)
+        if grid not in schedules:
+            schedules[grid] = compute_tile_schedule(*grid)
+
+        pair_footprint = footprint if item.uses_footprint else None
+        image_timings: Dict[str, float] = {}
+        with metrics.timed("inference", image_timings):
+            mask, stats = infer_label_map(
+                image, item.model_path, postprocessing, item.mask_type == "damage_severity_mask", item.base_name,
+                image_timings,
+                footprint=pair_footprint if PAIR_MODE == "fused" else None,
+                stats_footprint=pair_footprint if PAIR_STATS_IN_FOOTPRINT else None,
+                schedule=schedules[grid],
+            )
+        if timings is not None:
+            timings.append(image_timings)
+        if item.mask_type == "localisation" and _footprint_dependent():
+            footprint = localisation_footprint(mask)
+        results.append((mask, stats))
+    return results, footprint
+
+
+def run_pair_inference(images: List[np.ndarray], items: List[PairImage], postprocessing: str,
+                       footprint: Optional[np.ndarray] = None
+                       ) -> Tuple[List[Tuple[np.ndarray, Optional[Dict[str, Any]]]], Optional[np.ndarray]]:
+    """
+    ``infer_pair``, in a worker process (one task per pair) if configured.
+
+    Stages are observed once per image in either mode; "pair_inference" covers the whole pair as seen
+    from here (including the hand-off to the worker).
+    """
+    with metrics.timed("pair_inference"):
+        pool = get_inference_pool()
+        if pool is not None:
+            results, footprint, timings = pool.infer_pair(images, items, postprocessing, footprint)
+            # Stages ran in the worker process; record them here where /metrics is served
+            for image_timings in timings:
+                metrics.observe_many(image_timings)
+        else:
+            results, footprint = infer_pair(images, items, postprocessing, footprint)
+
+    for item in items:
+        metrics.inc("inference_images_total", mask_type=item.mask_type)
+    return results, footprint
+
+
+class FootprintCache:
+    """
+    Bit-packed localisation footprints by localisation cache key, least recently used first out.
+
+    Lets a damage pass use the pair's localisation when that came from the
+    result cache (only its mask URL is cached) without downloading the mask.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[Tuple[int, int], np.ndarray]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Optional[str]) -> Optional[np.ndarray]:
+        with self._lock:
+            entry = self._entries.get(key) if key is not None else None
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+        shape, packed = entry
+        return np.unpackbits(packed, count=shape[0] * shape[1]).reshape(shape)
+
+    def put(self, key: str, footprint: np.ndarray):
+        if self.max_entries <= 0:
+            return
+        entry = (footprint.shape, np.packbits(footprint > 0))
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+_footprints = FootprintCache(PAIR_FOOTPRINT_CACHE_SIZE if RESULT_CACHE_ENABLED else 0)
+
+
+def _pair_damage_lookup(fetched: FetchedImage, localisation_key: Optional[str],
+                        uses_footprint: bool) -> FetchedImage:
+    """
+    Resolve the cached result of a damage image whose result depends on the pair's localisation.
+
+    Results made with the pair's footprint are keyed by the damage image and
+    the localisation result; a damage image processed on its own (no usable
+    localisation) is keyed like an independent result. Exactly one key is
+    looked up, so every damage image counts as a single hit or miss.
+    """
+    if fetched.cache_key is None:
+        return fetched
+
+    key = fetched.cache_key
+    if localisation_key is not None and uses_footprint:
+        key = make_cache_key(fetched.cache_key, localisation=localisation_key, pair_mode=PAIR_MODE,
+                             margin=PAIR_FOOTPRINT_MARGIN, stats_in_footprint=PAIR_STATS_IN_FOOTPRINT)
+    return FetchedImage(image=fetched.image, cache_key=key, cached=result_cache.get(key))
+
+
+@dataclass
+class PairResult:
+    """Masks and damage stats produced for one image pair."""
+    pair_index: int
+    mask_image_urls: Dict[str, str]
+    damage_severities: List[Dict[str, Any]]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "pair_index": self.pair_index,
+            "mask_image_urls": self.mask_image_urls,
+            "damage_severities": self.damage_severities,
+        }
+
+
+# (task, upload future or cached URL, damage stats, result cache key)
+_PendingImage = Tuple[ImageTask, Any, Optional[Dict[str, Any]], Optional[str]]
+
+
+def process_pair(pair: PairTask, fetched: List[FetchedImage], postprocessing: str) -> List[_PendingImage]:
+    """
+    Turn a pair's fetched images into cached results or one pair pass, and hand new masks to the upload pool.
+
+    Returns the pair's images in order, each with its upload (or cached URL).
+    """
+    pending: List[Optional[_PendingImage]] = []
+    to_infer: List[Tuple[int, ImageTask, FetchedImage, bool]] = []
+    localisation_key: Optional[str] = None
+    localisation_shape: Optional[Tuple[int, int]] = None
+    inferred_localisation = False
+    footprint: Optional[np.ndarray] = None
+
+    for task, item in zip(pair.tasks, fetched):
+        print(f"Processing {task.image_name}...")
+        uses_footprint = False
+        if task.mask_type == "localisation":
+            localisation_key = item.cache_key
+            if item.image is not None:
+                localisation_shape = item.image.shape[:2]
+                inferred_localisation = True
+            elif item.cached is not None and _footprint_dependent():
+                footprint = _footprints.get(localisation_key)
+                localisation_shape = footprint.shape if footprint is not None else None
+        elif _footprint_dependent():
+            if item.image is not None and localisation_shape is not None:
+                uses_footprint = localisation_shape == item.image.shape[:2]
+                if not uses_footprint:
+                    print("Pre- and post-disaster images differ in size; processing the damage image on its own")
+            item = _pair_damage_lookup(item, localisation_key, uses_footprint)
+
+        if item.cached is not None:
+            pending.append((task, item.cached["url"], item.cached.get("stats"), None))
+            continue
+        if item.image is None:
+            print(f"Failed to load image: {task.image_url}")
+            continue
+        to_infer.append((len(pending), task, item, uses_footprint))
+        pending.append(None)
+
+    if to_infer:
+        items = [PairImage(task.model_path, task.mask_type, split_filename_and_extension(task.image_name)[0],
+                           uses_footprint) for _, task, _, uses_footprint in to_infer]
+        results, footprint = run_pair_inference([item.image for _, _, item, _ in to_infer], items,
+                                                postprocessing, footprint)
+        for (slot, task, item, _), (mask, stats) in zip(to_infer, results):
+            # Same colours as the batch pipeline's masks for this model's configuration
+            label_palette = model_registry.build_config(task.model_path).label_palette()
+            upload = _upload_pool.submit(save_and_upload_mask, mask,
+                                         mask_public_id(task.image_name, item.cache_key), label_palette)
+            pending[slot] = (task, upload, stats, item.cache_key)
+        if inferred_localisation and footprint is not None and localisation_key is not None:
+            _footprints.put(localisation_key, footprint)
+    return pending
+
+
+def _collect_pair(pair_index: int, pending: List[_PendingImage]) -> PairResult:
+    """Wait for a pair's uploads, in submission order, and cache the results."""
+    result = PairResult(pair_index, {}, [])
+    for task, upload, stats, cache_key in pending:
+        url = upload.result() if isinstance(upload, Future) else upload
+        result.mask_image_urls[task.image_name] = url
+        if stats is not None:
+            result.damage_severities.append(stats)
+        if cache_key is not None:
+            result_cache.put(cache_key, {"url": url, "stats": stats})
+    return result
+
+
+def iter_pair_results(image_pairs: List[Dict[str, str]], postprocessing: str) -> Iterator[PairResult]:
+    """
+    Run the /predict workload as a staged pipeline of pairs, yielding each pair in order as it finishes.
+
+    A pair's images are downloaded and decoded once, ahead of inference on
+    the download pool, then run as one pair pass (``infer_pair``) and their
+    masks handed to the upload pool, so I/O overlaps with inference. A
+    pair's uploads are only awaited once the next pair has been inferred.
+    Images with a cached result skip inference and upload.
+    """
+    pairs = plan_pair_tasks(image_pairs)
+
+    # Keep at most DOWNLOAD_PREFETCH images (whole pairs, at least one) in flight ahead of inference
+    downloads: deque = deque()
+    next_download = 0
+    in_flight = 0
+
+    def _fill_downloads():
+        nonlocal next_download, in_flight
+        while next_download < len(pairs) and (not downloads or in_flight < DOWNLOAD_PREFETCH):
+            pair = pairs[next_download]
+            # Damage results that depend on the localisation are looked up once it is known
+            futures = [_download_pool.submit(fetch_image, task, postprocessing,
+                                             not (_footprint_dependent() and task.mask_type == "damage_severity_mask"))
+                       for task in pair.tasks]
+            downloads.append((pair, futures))
+            in_flight += len(futures)
+            next_download += 1
+
+    _fill_downloads()
+    previous: Optional[Tuple[int, List[_PendingImage]]] = None
+
+    while downloads:
+        pair, futures = downloads.popleft()
+        fetched = [future.result() for future in futures]
+        in_flight -= len(futures)
+        _fill_downloads()
+
+        pending = process_pair(pair, fetched, postprocessing)
+
+        if previous is not None:
+            yield _collect_pair(*previous)
+        previous = (pair.pair_index, pending)
+
+    if previous is not None:
+        yield _collect_pair(*previous)
+
+
+def process_image_pairs(image_pairs: List[Dict[str, str]], postprocessing: str) -> Dict[str, Any]:
+    """Run the /predict workload and return the response with the order and shape of a sequential run."""
+    mask_image_urls: List[Dict[str, str]] = []
+    damage_severities: List[Dict[str, Any]] = []
+    for result in iter_pair_results(image_pairs, postprocessing):
+        mask_image_urls.append(result.mask_image_urls)
+        damage_severities.extend(result.damage_severities)
+
+    return {
+        "mask_image_urls": mask_image_urls,
+        "damage_severities": damage_severities,
+    }
@@ -0,0 +1,117 @@
+import os
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+
+def _env_bool(name: str, default: bool = False) -> bool:
+    """Read a boolean flag such as ``1``/``true``/``yes`` from the environment."""
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _env_int(name: str, default: int) -> int:
+    """Read an integer from the environment, falling back to ``default``."""
+    value = os.getenv(name)
+    return int(value) if value not in (None, "") else default
+
+
+def _env_float(name: str, default: float) -> float:
+    """Read a float from the environment, falling back to ``default``."""
+    value = os.getenv(name)
+    return float(value) if value not in (None, "") else default
+
+
+# --------------------------------------------------------------------------- #
+# Models                                                                      #
+# --------------------------------------------------------------------------- #
+LOCALISATION_MODEL_PATH = os.getenv("LOCALISATION_MODEL_PATH", "./models/best_localization.pt")
+DAMAGE_MODEL_PATH = os.getenv("DAMAGE_MODEL_PATH", "./models/best_256_new.pt")
+
+# Load (and run a dummy tile through) both models when the app boots
+WARMUP_MODELS = _env_bool("WARMUP_MODELS", False)
+
+# Worker processes running inference (0 runs it in the web process)
+INFERENCE_PROCESSES = _env_int("INFERENCE_PROCESSES", 0)
+
+# Compare weight files by content hash instead of mtime/size only
+MODEL_REGISTRY_HASH_WEIGHTS = _env_bool("MODEL_REGISTRY_HASH_WEIGHTS", False)
+
+# Hot reload of new damage weights (0 disables the background watcher)
+WEIGHT_WATCH_INTERVAL = _env_float("WEIGHT_WATCH_INTERVAL", 0)         # seconds between checks
+WEIGHT_SOURCE = os.getenv("WEIGHT_SOURCE", "clearml")                   # "clearml" or "local"
+WEIGHT_SOURCE_DIR = os.getenv("WEIGHT_SOURCE_DIR", "./models/incoming")  # watched by the "local" source
+MODEL_VERSIONS_DIR = os.getenv("MODEL_VERSIONS_DIR", "./models/versions")  # installed weight versions
+
+# Tiling of served images ("padded" covers the whole image, "grid" drops partial edge tiles)
+TILING_MODE = os.getenv("TILING_MODE", "padded")
+TILE_OVERLAP = _env_int("TILE_OVERLAP", 0)  # pixels shared by neighbouring tiles
+# Skip tiles unlikely to contain buildings: "variance", "entropy" or "nodata" (empty runs every tile)
+TILE_FILTER = os.getenv("TILE_FILTER", "")
+TILE_FILTER_THRESHOLD = os.getenv("TILE_FILTER_THRESHOLD", "")  # empty uses the filter's default
+# Label tiles from the model's raster instance masks ("raster") or its polygons ("polygon")
+MASK_ASSEMBLY = os.getenv("MASK_ASSEMBLY", "polygon")
+MASK_OVERLAP = os.getenv("MASK_OVERLAP", "last")  # overlapping instances: "last" or most "confidence" wins
+
+# How the two images of a pair are processed: "independent" runs each model on its whole image,
+# "fused" localises the pre-disaster image first and runs the damage model only on tiles with buildings
+PAIR_MODE = os.getenv("PAIR_MODE", "independent")
+PAIR_FOOTPRINT_MARGIN = _env_int("PAIR_FOOTPRINT_MARGIN", 16)  # pixels the localised buildings are grown by
+# Count damage clusters only inside the pair's (grown) localised buildings, in either pair mode
+PAIR_STATS_IN_FOOTPRINT = _env_bool("PAIR_STATS_IN_FOOTPRINT", False)
+# Localisation footprints kept in memory, so fused passes still work when the localisation was a cache hit
+PAIR_FOOTPRINT_CACHE_SIZE = _env_int("PAIR_FOOTPRINT_CACHE_SIZE", 256)
+
+# Share forward passes between concurrent requests (per model)
+MICRO_BATCHING = _env_bool("MICRO_BATCHING", True)
+MICRO_BATCH_MAX_SIZE = _env_int("MICRO_BATCH_MAX_SIZE", 32)        # tiles per forward pass
+MICRO_BATCH_MAX_WAIT_MS = _env_float("MICRO_BATCH_MAX_WAIT_MS", 5.0)  # wait for more tiles before running
+
+# --------------------------------------------------------------------------- #
+# /predict concurrency                                                        #
+# --------------------------------------------------------------------------- #
+# Threads downloading source images / uploading masks to Cloudinary
+DOWNLOAD_WORKERS = _env_int("DOWNLOAD_WORKERS", 4)
+UPLOAD_WORKERS = _env_int("UPLOAD_WORKERS", 4)
+
+# Images downloaded ahead of the one being inferred (bounds memory per request)
+DOWNLOAD_PREFETCH = _env_int("DOWNLOAD_PREFETCH", 4)
+
+# --------------------------------------------------------------------------- #
+# Image downloads                                                             #
+# --------------------------------------------------------------------------- #
+HTTP_CONNECT_TIMEOUT = _env_float("HTTP_CONNECT_TIMEOUT", 5.0)   # seconds
+HTTP_READ_TIMEOUT = _env_float("HTTP_READ_TIMEOUT", 30.0)        # seconds
+HTTP_RETRIES = _env_int("HTTP_RETRIES", 3)
+HTTP_POOL_SIZE = _env_int("HTTP_POOL_SIZE", max(DOWNLOAD_WORKERS, 10))  # keep-alive connections per host
+
+# --------------------------------------------------------------------------- #
+# Mask uploads                                                                #
+# --------------------------------------------------------------------------- #
+MASK_PNG_COMPRESSION = _env_int("MASK_PNG_COMPRESSION", 1)  # zlib level 0-9
+# Write masks as palette-indexed PNGs (1 byte per pixel) instead of 3-channel BGR
+MASK_PNG_PALETTE = _env_bool("MASK_PNG_PALETTE", False)
+
+# Cluster stats "areas" as a list of per-cluster objects ("list") or one array per field ("columns")
+CLUSTER_STATS_FORMAT = os.getenv("CLUSTER_STATS_FORMAT", "list")
+
+# --------------------------------------------------------------------------- #
+# Result cache                                                                #
+# --------------------------------------------------------------------------- #
+RESULT_CACHE_ENABLED = _env_bool("RESULT_CACHE_ENABLED", True)
+RESULT_CACHE_SIZE = _env_int("RESULT_CACHE_SIZE", 1024)           # in-process entries
+RESULT_CACHE_DIR = os.getenv("RESULT_CACHE_DIR", "")              # empty disables the disk tier
+RESULT_CACHE_DISK_MAX_MB = _env_int("RESULT_CACHE_DISK_MAX_MB", 512)
+# Key images by URL + ETag (HEAD request, no download on a hit) instead of content hash
+RESULT_CACHE_USE_ETAG = _env_bool("RESULT_CACHE_USE_ETAG", False)
+
+# --------------------------------------------------------------------------- #
+# Async jobs                                                                  #
+# --------------------------------------------------------------------------- #
+JOB_WORKERS = _env_int("JOB_WORKERS", 2)                  # jobs processed concurrently
+JOB_STORE = os.getenv("JOB_STORE", "memory")              # "memory" or "supabase"
+JOB_TABLE = os.getenv("JOB_TABLE", "inference_jobs")      # Supabase table for JOB_STORE=supabase
+JOB_MAX_RETAINED = _env_int("JOB_MAX_RETAINED", 1000)     # finished jobs kept by the memory store
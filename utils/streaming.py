@@ -0,0 +1,177 @@
+import os
+import time
+import numpy as np
+from typing import Optional, Set
+
+from utils.perform_inference import (
+    Config, YoloInference, Postprocessor, Tile, compute_tile_schedule, extract_tile,
+)
+
+# ------------------------------------------------------------------------
+# Windowed readers
+# ------------------------------------------------------------------------
+
+class WindowReader:
+    """Read rectangular windows of a BGR uint8 image without loading all of it."""
+
+    height: int
+    width: int
+
+    def read(self, y1: int, y2: int, x1: int, x2: int) -> np.ndarray:
+        """Return the (y2 - y1, x2 - x1, 3) window; the bounds lie inside the image."""
+        raise NotImplementedError
+
+    def read_tile(self, tile: Tile, tile_size: int) -> np.ndarray:
+        """Return a model tile, zero-padded where it runs past the image (as ``extract_tile``)."""
+        window = self.read(tile.y, min(tile.y + tile_size, self.height),
+                           tile.x, min(tile.x + tile_size, self.width))
+        if window.shape[0] == tile_size and window.shape[1] == tile_size:
+            return window
+        padded = np.zeros((tile_size, tile_size) + window.shape[2:], dtype=window.dtype)
+        padded[:window.shape[0], :window.shape[1]] = window
+        return padded
+
+
+class ArrayWindowReader(WindowReader):
+    """Windows of an in-memory or memory-mapped (``np.load(..., mmap_mode="r")``) array."""
+
+    def __init__(self, array: np.ndarray):
+        self.array = array
+        self.height, self.width = array.shape[:2]
+
+    def read(self, y1: int, y2: int, x1: int, x2: int) -> np.ndarray:
+        return self.array[y1:y2, x1:x2]
+
+    def read_tile(self, tile: Tile, tile_size: int) -> np.ndarray:
+        # Only the pages under the tile are touched when the array is a memmap
+        return extract_tile(self.array, tile, tile_size)
+
+
+class RasterioWindowReader(WindowReader):
+    """Windows of a GeoTIFF (or any GDAL raster) read with rasterio; bands 1-3 are taken as RGB."""
+
+    def __init__(self, path: str):
+        try:
+            import rasterio
+        except ImportError as e:
+            raise ImportError("Streaming rasters needs rasterio (pip install rasterio), "
+                              "or convert the scene to a .npy array") from e
+        from rasterio.windows import Window
+
+        self._window = Window
+        self.dataset = rasterio.open(path)
+        self.height, self.width = self.dataset.height, self.dataset.width
+
+    def read(self, y1: int, y2: int, x1: int, x2: int) -> np.ndarray:
+        rgb = self.dataset.read((1, 2, 3), window=self._window(x1, y1, x2 - x1, y2 - y1))
+        # Bands first -> pixels first, RGB -> BGR to match cv2.imread
+        return np.ascontiguousarray(rgb.transpose(1, 2, 0)[:, :, ::-1]).astype(np.uint8, copy=False)
+
+    def close(self):
+        self.dataset.close()
+
+
+def open_window_reader(path: str) -> WindowReader:
+    """Pick a windowed reader for ``path`` by extension."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".npy":
+        return ArrayWindowReader(np.load(path, mmap_mode="r"))
+    if ext in (".tif", ".tiff", ".vrt", ".jp2"):
+        return RasterioWindowReader(path)
+    raise ValueError(f"Can't stream '{ext}' files; use a .npy array or a raster readable by rasterio")
+
+
+# ------------------------------------------------------------------------
+# Streaming inference
+# ------------------------------------------------------------------------
+
+def stream_prediction_mask(model: YoloInference, postprocessor: Postprocessor, reader: WindowReader,
+                           output_path: str, mode: Optional[str] = None,
+                           block_size: Optional[int] = None, halo: Optional[int] = None) -> np.memmap:
+    """
+    Infer and post-process a scene block by block into a memory-mapped ``.npy`` label map.
+
+    Each block of ``stream_block_size`` pixels is post-processed with
+    ``stream_halo`` pixels of context and only its core is written. Raw
+    predictions come from the whole-image tile schedule and are kept in a
+    strip of rows spanning the scene width, so halo tiles shared by
+    neighbouring blocks (across and down) are inferred once. Peak memory
+    depends on the block size, halo and scene width, not on the scene height.
+    The result matches ``generate_prediction_mask`` + ``postprocess`` on the
+    whole image as long as every object (and, for ``majority_vote``, every
+    building) is smaller than the halo.
+    """
+    config = model.config
+    block_size = block_size or config.stream_block_size
+    halo = config.stream_halo if halo is None else halo
+    height, width = reader.height, reader.width
+
+    schedule = compute_tile_schedule(height, width, config.tile_size, config.tile_overlap, config.tiling)
+    output = np.lib.format.open_memmap(output_path, mode="w+", dtype=np.uint8, shape=(height, width))
+
+    # Raw predictions for rows [strip_y1, strip_y1 + len(strip)); tile cores are disjoint, so each is run once
+    strip = np.zeros((0, width), dtype=np.uint8)
+    strip_y1 = 0
+    inferred: Set[int] = set()
+
+    for y1 in range(0, height, block_size):
+        y2 = min(y1 + block_size, height)
+        wy1, wy2 = max(0, y1 - halo), min(height, y2 + halo)
+
+        # Tiles owning any pixel of this block row's windows; the strip grows to hold their whole cores
+        tiles = [(i, tile) for i, tile in enumerate(schedule) if tile.core_y1 < wy2 and tile.core_y2 > wy1]
+        new_y1 = min([wy1] + [tile.core_y1 for _, tile in tiles])
+        new_y2 = max([wy2] + [tile.core_y2 for _, tile in tiles])
+        new_strip = np.zeros((new_y2 - new_y1, width), dtype=np.uint8)
+        keep_y1, keep_y2 = max(new_y1, strip_y1), min(new_y2, strip_y1 + len(strip))
+        if keep_y1 < keep_y2:
+            new_strip[keep_y1 - new_y1:keep_y2 - new_y1] = strip[keep_y1 - strip_y1:keep_y2 - strip_y1]
+        strip, strip_y1 = new_strip, new_y1
+
+        pending = [tile for i, tile in tiles if i not in inferred]
+        # Windows only move down, so a tile needed by a later block row is also needed by this one
+        inferred = {i for i, _ in tiles}
+        model.predict_into(pending, lambda tile: reader.read_tile(tile, config.tile_size), strip, strip_y1, 0)
+
+        for x1 in range(0, width, block_size):
+            x2 = min(x1 + block_size, width)
+            wx1, wx2 = max(0, x1 - halo), min(width, x2 + halo)
+            raw = np.ascontiguousarray(strip[wy1 - strip_y1:wy2 - strip_y1, wx1:wx2])
+            processed = postprocessor.postprocess(raw, mode)
+            output[y1:y2, x1:x2] = processed[y1 - wy1:y2 - wy1, x1 - wx1:x2 - wx1]
+
+    output.flush()
+    return output
+
+
+def main():
+    """
+    Stream a large scene through a model from the command line.
+
+    python -m utils.streaming scene.tif scene_mask.npy --model ./models/best_256_new.pt
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run segmentation on a large scene with bounded memory")
+    parser.add_argument("source", help="Scene to segment (.npy array or GeoTIFF)")
+    parser.add_argument("output", help="Label map to write (.npy, memory-mapped)")
+    parser.add_argument("--model", default=None, help="Weights to use (default: the config's model_path)")
+    parser.add_argument("--config", default=None, help="Optional configuration YAML file")
+    parser.add_argument("--postprocessing", default=None, help="Override the configured post-processing mode")
+    parser.add_argument("--block-size", type=int, default=None)
+    parser.add_argument("--halo", type=int, default=None)
+    args = parser.parse_args()
+
+    config = Config.load_from_yaml(args.config) if args.config else Config.default_config()
+    if args.model:
+        config.model_path = args.model
+
+    reader = open_window_reader(args.source)
+    start = time.time()
+    stream_prediction_mask(YoloInference(config), Postprocessor(config), reader, args.output,
+                           mode=args.postprocessing, block_size=args.block_size, halo=args.halo)
+    print(f"Wrote {reader.height}x{reader.width} label map to {args.output} in {time.time() - start:.2f} seconds")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,28 @@
-from supabase import create_client
 import os
+import threading
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
-# Initialize Supabase client
+# Supabase client, created on first use so importing this module needs neither the SDK nor credentials
 supabase_url = os.getenv('SUPABASE_HOST_URL')
 supabase_key = os.getenv('SUPABASE_API_SECRET')
-supabase_client = create_client(supabase_url, supabase_key) 
+_supabase_client = None
+_supabase_lock = threading.Lock()
 
 def get_new_supabase_client():
-    return supabase_client
+    global _supabase_client
+    with _supabase_lock:
+        if _supabase_client is None:
+            from supabase import create_client
+            _supabase_client = create_client(supabase_url, supabase_key)
+        return _supabase_client
 
 # INSERT
 def insert_row(table_name: str, data: dict):
     """Insert a single row into a Supabase table."""
-    response = supabase_client.table(table_name).insert(data).execute()
+    response = get_new_supabase_client().table(table_name).insert(data).execute()
     return response.data if response.data else response.error
 
 def insert_multiple_rows(table_name: str, data_list: list[dict]) -> list[dict] | None:
@@ -35,7 +41,7 @@ def insert_multiple_rows(table_name: str, data_list: list[dict]) -> list[dict] |
         return None
 
     try:
-        response = supabase_client.table(table_name).insert(data_list).execute()
+        response = get_new_supabase_client().table(table_name).insert(data_list).execute()
         if response.data:
             return response.data
         else:
@@ -48,13 +54,13 @@ def insert_multiple_rows(table_name: str, data_list: list[dict]) -> list[dict] |
 # RETRIEVE BY ID
 def get_row_by_id(table_name: str, id_field: str, id_value):
     """Retrieve a single row by its ID field (usually primary key)."""
-    response = supabase_client.table(table_name).select("*").eq(id_field, id_value).execute()
+    response = get_new_supabase_client().table(table_name).select("*").eq(id_field, id_value).execute()
     return response.data if response.data else response.error
 
 # RETRIEVE BY MULTIPLE FIELDS
 def get_rows_by_filters(table_name: str, filters: dict):
     """Retrieve rows matching multiple filters (e.g., {'user_id': 1, 'status': 'done'})."""
-    query = supabase_client.table(table_name).select("*")
+    query = get_new_supabase_client().table(table_name).select("*")
     for field, value in filters.items():
         query = query.eq(field, value)
     response = query.execute()
@@ -63,11 +69,11 @@ def get_rows_by_filters(table_name: str, filters: dict):
 # UPDATE BY ID
 def update_row_by_id(table_name: str, id_field: str, id_value, updated_data: dict):
     """Update a row based on its ID field."""
-    response = supabase_client.table(table_name).update(updated_data).eq(id_field, id_value).execute()
+    response = get_new_supabase_client().table(table_name).update(updated_data).eq(id_field, id_value).execute()
     return response.data if response.data else response.error
 
 # DELETE BY ID
 def delete_row_by_id(table_name: str, id_field: str, id_value):
     """Delete a row based on its ID field."""
-    response = supabase_client.table(table_name).delete().eq(id_field, id_value).execute()
+    response = get_new_supabase_client().table(table_name).delete().eq(id_field, id_value).execute()
     return response.data if response.data else response.error
\ No newline at end of file
@@ -0,0 +1,246 @@
+import os
+import glob
+import shutil
+import hashlib
+import tempfile
+import threading
+import traceback
+from typing import Optional, Tuple
+
+from utils.settings import (
+    DAMAGE_MODEL_PATH, WEIGHT_WATCH_INTERVAL, WEIGHT_SOURCE, WEIGHT_SOURCE_DIR, MODEL_VERSIONS_DIR,
+)
+
+CLEARML_MODEL_NAME = "YOLOv9_BuildingDamage_Segmentation"
+WEIGHT_FLAG_TABLE = "new_weight_check"
+
+
+# ------------------------------------------------------------------------
+# Weight sources
+# ------------------------------------------------------------------------
+
+class WeightSource:
+    """Where new model weights come from."""
+
+    def fetch(self) -> Optional[str]:
+        """Download new weights if there are any and return their local path, else None."""
+        raise NotImplementedError
+
+    def acknowledge(self, version_path: str):
+        """Mark the weights returned by the last ``fetch`` as installed at ``version_path``."""
+
+
+def _source_marker(version_path: str) -> str:
+    """File next to an installed version recording which published model it came from."""
+    return f"{version_path}.source"
+
+
+class ClearMLWeightSource(WeightSource):
+    """
+    Published ClearML model.
+
+    By default a model is new when its ID differs from the one recorded next
+    to the version this replica serves, so every replica (including ones
+    started later from an older image) decides for itself. With
+    ``use_flag`` the ``new_weight`` flag in Supabase gates the check and is
+    cleared once the weights are installed; that shared one-shot flag is
+    only meant for the build-time ``download_weights``.
+    """
+
+    def __init__(self, model_name: str = CLEARML_MODEL_NAME, tags: Tuple[str, ...] = ("best",),
+                 flag_table: str = WEIGHT_FLAG_TABLE, use_flag: bool = False,
+                 serving_path: str = DAMAGE_MODEL_PATH):
+        self.model_name = model_name
+        self.tags = list(tags)
+        self.flag_table = flag_table
+        self.use_flag = use_flag
+        self.serving_path = serving_path
+        self._flag_id = None
+        self._pending_model_id: Optional[str] = None
+
+    def _active_model_id(self) -> Optional[str]:
+        """ClearML model ID of the version behind the serving path, if it was installed from ClearML."""
+        try:
+            with open(_source_marker(os.path.realpath(self.serving_path))) as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    def fetch(self) -> Optional[str]:
+        # Imported here so the clients are only created when this source is used
+        from clearml import Model
+
+        if self.use_flag:
+            from utils.supabase_utils import get_new_supabase_client
+
+            response = get_new_supabase_client().table(self.flag_table).select("*").execute()
+            if not response.data or not response.data[0]["new_weight"]:
+                return None
+            self._flag_id = response.data[0]["id"]
+
+        models = Model.query_models(model_name=self.model_name, tags=self.tags, only_published=True)
+        if not models:
+            raise ValueError("No published models found with the specified name/tag.")
+
+        model = models[0]
+        if not self.use_flag and model.id == self._active_model_id():
+            return None
+        self._pending_model_id = model.id
+        return model.get_local_copy()
+
+    def acknowledge(self, version_path: str):
+        if self._pending_model_id is not None:
+            with open(_source_marker(version_path), "w") as f:
+                f.write(self._pending_model_id)
+            self._pending_model_id = None
+
+        if self._flag_id is None:
+            return
+        from utils.supabase_utils import get_new_supabase_client
+
+        get_new_supabase_client().table(self.flag_table).update({"new_weight": False}).eq("id", self._flag_id).execute()
+        self._flag_id = None
+        print("Updated weight status in Supabase")
+
+
+class LocalDirectoryWeightSource(WeightSource):
+    """Newest ``*.pt`` file dropped into a directory; files present at start-up are ignored."""
+
+    def __init__(self, directory: str = WEIGHT_SOURCE_DIR, pattern: str = "*.pt"):
+        self.directory = directory
+        self.pattern = pattern
+        self._installed = self._newest()
+        self._pending = None
+
+    def _newest(self) -> Optional[Tuple[str, int]]:
+        files = [(path, os.stat(path).st_mtime_ns) for path in glob.glob(os.path.join(self.directory, self.pattern))]
+        return max(files, key=lambda item: item[1]) if files else None
+
+    def fetch(self) -> Optional[str]:
+        newest = self._newest()
+        if newest is None or newest == self._installed:
+            return None
+        self._pending = newest
+        return newest[0]
+
+    def acknowledge(self, version_path: str):
+        self._installed = self._pending
+
+
+def create_weight_source(kind: str = WEIGHT_SOURCE) -> WeightSource:
+    """Build the weight source selected by ``WEIGHT_SOURCE``."""
+    if kind == "clearml":
+        return ClearMLWeightSource()
+    if kind == "local":
+        return LocalDirectoryWeightSource()
+    raise ValueError(f"Unknown weight source '{kind}', expected 'clearml' or 'local'")
+
+
+# ------------------------------------------------------------------------
+# Installing weights
+# ------------------------------------------------------------------------
+
+def install_weights(source_path: str, serving_path: str = DAMAGE_MODEL_PATH,
+                    versions_dir: str = MODEL_VERSIONS_DIR) -> str:
+    """
+    Copy weights to a content-addressed file in ``versions_dir`` and return its path.
+
+    Versions are never modified once written, so a process still reading the
+    previous version is unaffected.
+    """
+    sha256 = hashlib.sha256()
+    with open(source_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            sha256.update(chunk)
+
+    stem, ext = os.path.splitext(os.path.basename(serving_path))
+    version_path = os.path.join(versions_dir, f"{stem}-{sha256.hexdigest()[:12]}{ext}")
+    if os.path.exists(version_path):
+        return version_path
+
+    os.makedirs(versions_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=versions_dir, suffix=".tmp")
+    os.close(fd)
+    shutil.copyfile(source_path, tmp_path)
+    os.replace(tmp_path, version_path)
+    print(f"Installed weights as {version_path}")
+    return version_path
+
+
+def activate_weights(version_path: str, serving_path: str = DAMAGE_MODEL_PATH):
+    """Atomically point ``serving_path`` at an installed version (a symlink swap)."""
+    os.makedirs(os.path.dirname(serving_path) or ".", exist_ok=True)
+    tmp_link = f"{serving_path}.{os.getpid()}.tmp"
+    if os.path.lexists(tmp_link):
+        os.remove(tmp_link)
+    os.symlink(os.path.abspath(version_path), tmp_link)
+    os.replace(tmp_link, serving_path)
+    print(f"Serving {serving_path} -> {version_path}")
+
+
+# ------------------------------------------------------------------------
+# Background watcher
+# ------------------------------------------------------------------------
+
+class WeightWatcher:
+    """
+    Polls a weight source and hot-swaps new damage weights into the serving path.
+
+    New weights are installed as a new version, loaded and warmed, and only
+    then is the serving symlink swapped. The model registry notices the new
+    target on the next lookup; requests already running keep the model they
+    started with.
+    """
+
+    def __init__(self, source: WeightSource, serving_path: str = DAMAGE_MODEL_PATH,
+                 versions_dir: str = MODEL_VERSIONS_DIR, interval: float = WEIGHT_WATCH_INTERVAL):
+        self.source = source
+        self.serving_path = serving_path
+        self.versions_dir = versions_dir
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _warm_up(self, version_path: str):
+        """Load the new version wherever inference runs, so the swap doesn't cause a cold start."""
+        from utils.model_registry import model_registry
+        from utils.worker_pool import get_inference_pool
+
+        pool = get_inference_pool()
+        if pool is not None:
+            pool.warm_up([version_path])
+        else:
+            model_registry.warm_up([version_path])
+
+    def check_once(self) -> Optional[str]:
+        """Install, warm up and activate new weights if the source has any; returns the new version path."""
+        source_path = self.source.fetch()
+        if source_path is None:
+            return None
+
+        version_path = install_weights(source_path, self.serving_path, self.versions_dir)
+        if os.path.realpath(self.serving_path) != os.path.realpath(version_path):
+            self._warm_up(version_path)
+            activate_weights(version_path, self.serving_path)
+        self.source.acknowledge(version_path)
+        return version_path
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check_once()
+            except Exception:
+                # Keep serving the current weights and try again on the next check
+                traceback.print_exc()
+
+    def start(self):
+        """Start polling in a daemon thread."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="weight-watcher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
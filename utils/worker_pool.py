@@ -0,0 +1,206 @@
+import threading
+import multiprocessing as mp
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+from utils.metrics import metrics
+from utils.settings import INFERENCE_PROCESSES, WARMUP_MODELS, LOCALISATION_MODEL_PATH, DAMAGE_MODEL_PATH
+
+# ------------------------------------------------------------------------
+# Shared memory helpers
+# ------------------------------------------------------------------------
+
+def _close(shm: shared_memory.SharedMemory):
+    """Close a block, tolerating views kept alive by an in-flight exception's traceback."""
+    try:
+        shm.close()
+    except BufferError:
+        pass
+
+
+def _to_shared(array: np.ndarray) -> shared_memory.SharedMemory:
+    """Copy an array into a new shared memory block."""
+    shm = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+    return shm
+
+
+# ------------------------------------------------------------------------
+# Worker process side
+# ------------------------------------------------------------------------
+
+def _init_worker(warm_up: bool, model_paths: Tuple[str, ...]):
+    """
+    Set up the models of a worker process, loading and warming them up front if ``warm_up``.
+
+    A worker runs one pair at a time, so micro-batching could never merge
+    tiles from other requests and would only add its wait; it is turned off.
+    """
+    from utils.model_registry import model_registry
+    model_registry.micro_batching = False
+    if warm_up:
+        model_registry.warm_up(model_paths)
+
+
+def _infer_pair_shared(images: List[Tuple[str, Tuple[int, ...], str]], items: List[Any], postprocessing: str,
+                       footprint: Optional[Tuple[str, Tuple[int, int]]] = None
+                       ) -> Tuple[List[Optional[Dict[str, Any]]], Optional[Tuple[Tuple[int, int], np.ndarray]],
+                                  List[Dict[str, float]], Dict[Tuple, float]]:
+    """
+    Run a pair pass on images in shared memory, writing the label maps back.
+
+    ``images`` holds (image block, shape, mask block) per image. Returns the
+    cluster stats per image, the (shape, bit-packed) footprint, per-stage timings per image
+    and the counter increments.
+    """
+    from utils.serving import infer_pair
+
+    # Workers share the parent's resource tracker, so the parent's unlink cleans up every block
+    blocks = []
+    try:
+        arrays = []
+        for image_name, image_shape, mask_name in images:
+            image_shm = shared_memory.SharedMemory(name=image_name)
+            mask_shm = shared_memory.SharedMemory(name=mask_name)
+            blocks += [image_shm, mask_shm]
+            arrays.append((np.ndarray(image_shape, dtype=np.uint8, buffer=image_shm.buf),
+                           np.ndarray(image_shape[:2], dtype=np.uint8, buffer=mask_shm.buf)))
+        footprint_array = None
+        if footprint is not None:
+            footprint_shm = shared_memory.SharedMemory(name=footprint[0])
+            blocks.append(footprint_shm)
+            footprint_array = np.ndarray(footprint[1], dtype=np.uint8, buffer=footprint_shm.buf)
+
+        # Each worker runs one task at a time, so the counter changes are this task's
+        counters_before = metrics.counter_values()
+        timings: List[Dict[str, float]] = []
+        results, pair_footprint = infer_pair([image for image, _ in arrays], items, postprocessing,
+                                             footprint_array, timings)
+        for i, (processed_mask, _) in enumerate(results):
+            arrays[i][1][...] = processed_mask
+        packed = (pair_footprint.shape, np.packbits(pair_footprint > 0)) if pair_footprint is not None else None
+
+        counters = {key: value - counters_before.get(key, 0)
+                    for key, value in metrics.counter_values().items() if value != counters_before.get(key, 0)}
+
+        # Drop the views before closing, or the buffers stay exported
+        del arrays, footprint_array, pair_footprint
+        return [stats for _, stats in results], packed, timings, counters
+    finally:
+        for shm in blocks:
+            _close(shm)
+
+
+def _ping() -> bool:
+    return True
+
+
+def _warm_up(model_paths: Tuple[str, ...]):
+    from utils.model_registry import model_registry
+    model_registry.warm_up(model_paths)
+
+
+# ------------------------------------------------------------------------
+# Front-end side
+# ------------------------------------------------------------------------
+
+class InferencePool:
+    """
+    Pool of inference worker processes, each holding its own loaded models.
+
+    Images and label maps travel through shared memory blocks; only their
+    names, shapes, the (small) cluster stats and the bit-packed pair
+    footprint are pickled. Each task is a whole image pair.
+    """
+
+    def __init__(self, processes: int, warm_up: bool = WARMUP_MODELS,
+                 model_paths: Iterable[str] = (LOCALISATION_MODEL_PATH, DAMAGE_MODEL_PATH)):
+        self.processes = processes
+        # "spawn" keeps the front end's threads and any loaded models out of the workers
+        self._executor = ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=mp.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(warm_up, tuple(model_paths)),
+        )
+
+    def infer_pair(self, images: List[np.ndarray], items: List[Any], postprocessing: str,
+                   footprint: Optional[np.ndarray] = None
+                   ) -> Tuple[List[Tuple[np.ndarray, Optional[Dict[str, Any]]]], Optional[np.ndarray],
+                              List[Dict[str, float]]]:
+        """
+        ``serving.infer_pair`` as one worker task: (label map, stats) per image, the footprint
+        and the worker's per-stage timings, one dict per image.
+        """
+        images = [np.ascontiguousarray(image, dtype=np.uint8) for image in images]
+        blocks = []
+        try:
+            shared = []
+            for image in images:
+                image_shm = _to_shared(image)
+                mask_shm = shared_memory.SharedMemory(create=True, size=max(1, image.shape[0] * image.shape[1]))
+                blocks += [image_shm, mask_shm]
+                shared.append((image_shm.name, image.shape, mask_shm.name))
+            footprint_ref = None
+            if footprint is not None:
+                footprint_shm = _to_shared(np.ascontiguousarray(footprint, dtype=np.uint8))
+                blocks.append(footprint_shm)
+                footprint_ref = (footprint_shm.name, footprint.shape)
+
+            stats, packed, timings, counters = self._executor.submit(
+                _infer_pair_shared, shared, items, postprocessing, footprint_ref,
+            ).result()
+            results = [(np.ndarray(image.shape[:2], dtype=np.uint8, buffer=mask_shm.buf).copy(), image_stats)
+                       for image, mask_shm, image_stats in zip(images, blocks[1::2], stats)]
+            if packed is not None:
+                shape, bits = packed
+                footprint = np.unpackbits(bits, count=shape[0] * shape[1]).reshape(shape)
+            # Tile counts were made in the worker; add them here where /metrics is served
+            metrics.add_counters(counters)
+            return results, footprint, timings
+        finally:
+            for shm in blocks:
+                _close(shm)
+                shm.unlink()
+
+    def start(self, processes: int):
+        """
+        Start every worker process up front, so the first requests don't pay for spawning them.
+
+        Models are only loaded here when the pool warms up (WARMUP_MODELS);
+        otherwise each worker loads them on its first request.
+        """
+        futures = [self._executor.submit(_ping) for _ in range(processes)]
+        for future in futures:
+            future.result()
+
+    def warm_up(self, model_paths: Iterable[str]):
+        """
+        Load and warm models in the workers, one task per process.
+
+        Tasks are handed to whichever worker is free, so this is best effort:
+        a worker that missed out loads the model on its first request.
+        """
+        futures = [self._executor.submit(_warm_up, tuple(model_paths)) for _ in range(self.processes)]
+        for future in futures:
+            future.result()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+
+_pool: Optional[InferencePool] = None
+_pool_lock = threading.Lock()
+
+
+def get_inference_pool() -> Optional[InferencePool]:
+    """The process pool configured by INFERENCE_PROCESSES, or None to infer in-process."""
+    global _pool
+    if INFERENCE_PROCESSES <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = InferencePool(INFERENCE_PROCESSES)
+        return _pool